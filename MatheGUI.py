@@ -1,23 +1,37 @@
 # app.py
+import importlib
 import streamlit as st
-from teilnehmer_modul import teilnehmerverwaltung
-from test_modul import testverwaltung
-from prognose_modul import prognosesystem
-from bericht_modul import berichtswesen
+from metrik_modul import starte_rerun, beende_rerun, zeige_admin_panel
+
+# Seiten: Anzeigename -> (Modul, Funktion). Module werden erst beim ersten
+# Aufruf der Seite importiert, damit schwere Abhängigkeiten (PyCaret,
+# matplotlib, fpdf, openpyxl) den Start der übrigen Seiten nicht bremsen.
+SEITEN = {
+    "Teilnehmerverwaltung": ("teilnehmer_modul", "teilnehmerverwaltung"),
+    "Testverwaltung": ("test_modul", "testverwaltung"),
+    "Prognose-System": ("prognose_modul", "prognosesystem"),
+    "Berichtswesen": ("bericht_modul", "berichtswesen"),
+    "Kohortenanalyse": ("analyse_modul", "kohortenanalyse"),
+    "Import / Export": ("datenaustausch_modul", "datenaustausch"),
+}
+
+# Datenbankschema einmalig pro Prozess aktualisieren
+@st.cache_resource
+def initialisiere_datenbank():
+    from migration_modul import migriere
+    return migriere()
+
+initialisiere_datenbank()
 
 # Hauptlayout der Anwendung
 st.sidebar.title("Navigation")
-option = st.sidebar.radio(
-    "Bereich auswählen",
-    ["Teilnehmerverwaltung", "Testverwaltung", "Prognose-System", "Berichtswesen"]
-)
+option = st.sidebar.radio("Bereich auswählen", list(SEITEN))
 
-# Navigation zwischen Modulen
-if option == "Teilnehmerverwaltung":
-    teilnehmerverwaltung()
-elif option == "Testverwaltung":
-    testverwaltung()
-elif option == "Prognose-System":
-    prognosesystem()
-elif option == "Berichtswesen":
-    berichtswesen()
+# Navigation zwischen Modulen (Laufzeiten je Rerun werden aufgezeichnet)
+modul_name, funktion = SEITEN[option]
+starte_rerun(option)
+try:
+    getattr(importlib.import_module(modul_name), funktion)()
+finally:
+    beende_rerun()
+zeige_admin_panel()
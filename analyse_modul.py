@@ -0,0 +1,117 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from datenbank_modul import lese_abfrage_gecacht
+from prognose_modul import KATEGORIEN
+
+# Gesamtprozent-Bereiche der Verteilung: 0 = 0-10 %, ..., 9 = 90-100 %
+ANZAHL_BEREICHE = 10
+
+# Gruppierungen der Auswertung (Anzeigename -> Spalte der Zusammenfassung)
+GRUPPIERUNGEN = {'Berufswunsch': 'berufswunsch', 'Kohorte (Eintrittsmonat)': 'kohorte'}
+
+# Die Zusammenfassung ändert sich genau dann, wenn testergebnisse geschrieben wird
+CACHE_TABELLEN = ('testergebnisse',)
+
+
+# Zusammenfassungstabelle
+def _bereich_sql(spalte):
+    """CASE-Ausdruck für den 10-%-Bereich (portabel, ohne FLOOR/LEAST)."""
+    stufen = ' '.join(f"WHEN {spalte} < {(i + 1) * 10} THEN {i}" for i in range(ANZAHL_BEREICHE - 1))
+    return f"CASE {stufen} ELSE {ANZAHL_BEREICHE - 1} END"
+
+def _kategorie_prozent_sql(praefix):
+    return f"CASE WHEN e.{praefix}_max > 0 THEN e.{praefix}_erreicht * 100.0 / e.{praefix}_max ELSE 0 END"
+
+SUMMEN_SPALTEN = ['summe_gesamt', 'summe_quadrat_gesamt'] + [f"summe_{praefix}" for praefix, _ in KATEGORIEN]
+
+# Aggregiert alle Testergebnisse mit id > ? und addiert sie auf die vorhandenen Summen
+ZUSAMMENFASSUNG_AKTUALISIEREN_SQL = f'''
+INSERT INTO ergebnis_zusammenfassung (berufswunsch, kohorte, test_monat, bereich, anzahl, {', '.join(SUMMEN_SPALTEN)})
+SELECT t.berufswunsch, substr(t.eintrittsdatum, 1, 7), substr(e.test_datum, 1, 7), {_bereich_sql('e.gesamt_prozent')},
+       COUNT(*), SUM(e.gesamt_prozent), SUM(e.gesamt_prozent * e.gesamt_prozent),
+       {', '.join(f'SUM({_kategorie_prozent_sql(praefix)})' for praefix, _ in KATEGORIEN)}
+FROM testergebnisse e JOIN teilnehmer t ON t.id = e.teilnehmer_id
+WHERE e.id > ?
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (berufswunsch, kohorte, test_monat, bereich) DO UPDATE SET
+    anzahl = ergebnis_zusammenfassung.anzahl + excluded.anzahl,
+    {', '.join(f'{spalte} = ergebnis_zusammenfassung.{spalte} + excluded.{spalte}' for spalte in SUMMEN_SPALTEN)}
+'''
+
+def aktualisiere_zusammenfassung(cursor, ab_id):
+    """Addiert alle Testergebnisse mit id > ab_id in die Zusammenfassung (in der laufenden Transaktion)."""
+    cursor.execute(ZUSAMMENFASSUNG_AKTUALISIEREN_SQL, (ab_id,))
+
+
+# Abfragen
+def _filter_sql(berufswuensche, kohorten):
+    bedingungen, parameter = [], []
+    for spalte, werte in (('berufswunsch', berufswuensche), ('kohorte', kohorten)):
+        if werte:
+            bedingungen.append(f"{spalte} IN ({', '.join('?' * len(werte))})")
+            parameter.extend(werte)
+    return (f"WHERE {' AND '.join(bedingungen)}" if bedingungen else ''), parameter
+
+def lade_kennzahlen(gruppierung, berufswuensche=(), kohorten=(), nach_monat=False):
+    """Aggregiert Anzahl, Mittelwerte und Standardabweichung je Gruppe (optional je Testmonat)."""
+    where, parameter = _filter_sql(berufswuensche, kohorten)
+    gruppe = f"{gruppierung}, test_monat" if nach_monat else gruppierung
+    df = lese_abfrage_gecacht(f'''
+    SELECT {gruppe}, SUM(anzahl) AS anzahl, {', '.join(f'SUM({spalte}) AS {spalte}' for spalte in SUMMEN_SPALTEN)}
+    FROM ergebnis_zusammenfassung {where}
+    GROUP BY {gruppe} ORDER BY {gruppe}
+    ''', parameter, CACHE_TABELLEN)
+
+    kennzahlen = df[[spalte.strip() for spalte in gruppe.split(',')] + ['anzahl']].copy()
+    kennzahlen['Gesamt'] = df['summe_gesamt'] / df['anzahl']
+    varianz = df['summe_quadrat_gesamt'] / df['anzahl'] - kennzahlen['Gesamt'] ** 2
+    kennzahlen['Standardabweichung'] = np.sqrt(varianz.clip(lower=0))
+    for praefix, anzeigename in KATEGORIEN:
+        kennzahlen[anzeigename] = df[f"summe_{praefix}"] / df['anzahl']
+    return kennzahlen
+
+def lade_verteilung(berufswuensche=(), kohorten=()):
+    """Anzahl der Testergebnisse je 10-%-Bereich des Gesamtergebnisses."""
+    where, parameter = _filter_sql(berufswuensche, kohorten)
+    df = lese_abfrage_gecacht(f'''
+    SELECT bereich, SUM(anzahl) AS anzahl FROM ergebnis_zusammenfassung {where}
+    GROUP BY bereich ORDER BY bereich
+    ''', parameter, CACHE_TABELLEN)
+    verteilung = pd.DataFrame({'bereich': range(ANZAHL_BEREICHE)}).merge(df, how='left').fillna({'anzahl': 0})
+    verteilung['Bereich'] = [f"{b * 10}-{(b + 1) * 10} %" for b in verteilung['bereich']]
+    return verteilung.set_index('Bereich')[['anzahl']]
+
+def lade_filterwerte(spalte):
+    """Vorhandene Werte einer Gruppierungsspalte."""
+    return lese_abfrage_gecacht(
+        f'SELECT DISTINCT {spalte} FROM ergebnis_zusammenfassung ORDER BY {spalte}', (), CACHE_TABELLEN
+    )[spalte].tolist()
+
+
+# Kohortenanalyse
+def kohortenanalyse():
+    st.header("Kohortenanalyse")
+
+    berufswuensche = st.multiselect("Berufswunsch", lade_filterwerte('berufswunsch'))
+    kohorten = st.multiselect("Kohorte (Eintrittsmonat)", lade_filterwerte('kohorte'))
+    gruppierung = GRUPPIERUNGEN[st.radio("Gruppieren nach", list(GRUPPIERUNGEN), horizontal=True)]
+
+    kennzahlen = lade_kennzahlen(gruppierung, berufswuensche, kohorten)
+    if kennzahlen.empty:
+        st.info("Keine Testergebnisse vorhanden.")
+        return
+
+    # Durchschnitt je Kategorie
+    st.subheader("Durchschnitt je Kategorie (%)")
+    st.dataframe(kennzahlen.round(1), hide_index=True)
+    st.bar_chart(kennzahlen.set_index(gruppierung)[[anzeigename for _, anzeigename in KATEGORIEN]])
+
+    # Verteilung der Gesamtergebnisse
+    st.subheader("Verteilung der Gesamtergebnisse")
+    st.bar_chart(lade_verteilung(berufswuensche, kohorten))
+
+    # Entwicklung über die Zeit
+    st.subheader("Entwicklung des Gesamtergebnisses je Testmonat (%)")
+    verlauf = lade_kennzahlen(gruppierung, berufswuensche, kohorten, nach_monat=True)
+    st.line_chart(verlauf.pivot(index='test_monat', columns=gruppierung, values='Gesamt'))
@@ -0,0 +1,238 @@
+"""Zeitmessungen der wichtigsten App-Abläufe bei 1k/10k/100k Testergebnissen.
+
+Je Größe wird eine frische SQLite-Datenbank in einem temporären Verzeichnis
+mit synthetischen Daten (benchmarks/testdaten.py) gefüllt; gemessen werden:
+- einfuegen_block / einfuegen_einzeln: Durchsatz beim Speichern von Testergebnissen
+- teilnehmerliste: Zählen, erste und letzte Seite, Textsuche (ohne Abfrage-Cache)
+- prognose_numpy: Batch-Prognose aller Teilnehmer mit dem Trend-Backend
+- training / prognose_pycaret: PyCaret-Training, erstelle_prognosedaten + generiere_prognosen
+- bericht_pdf / bericht_excel: Einzelberichte für eine Stichprobe von Teilnehmern
+- export_csv / export_excel: Export der gesamten Ergebnistabelle
+
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/app_benchmark.py --groessen 1000,10000 --json neu.json --vergleich alt.json
+
+Mit --vergleich werden die Zeiten einer früheren JSON-Datei gegenübergestellt;
+Szenarien, die um mehr als --toleranz langsamer sind, gelten als Regression
+(Exit-Code 1).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+PROJEKT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJEKT)
+
+import datenbank_modul  # noqa: E402
+from testdaten import erzeuge_ergebnisse, fuelle_datenbank  # noqa: E402
+
+# Teilnehmer je Stichprobe für Einzelprognosen und -berichte
+STICHPROBE = 20
+# Zeilen für die Messung einzelner Transaktionen
+EINZELNE_ZEILEN = 200
+# Kleinere Unterschiede (Sekunden) gelten beim Vergleich als Messrauschen
+MIN_DIFFERENZ = 0.005
+
+
+def miss(funktion, wiederholungen=3):
+    """Median der Laufzeit in Sekunden."""
+    zeiten = []
+    for _ in range(wiederholungen):
+        start = time.perf_counter()
+        funktion()
+        zeiten.append(time.perf_counter() - start)
+    return statistics.median(zeiten)
+
+
+# Szenarien
+def szenario_einfuegen(anzahl_zeilen):
+    start = time.perf_counter()
+    teilnehmer, ergebnisse = fuelle_datenbank(anzahl_zeilen)
+    dauer = time.perf_counter() - start
+    ergebnisse_block = {'sekunden': dauer, 'zeilen_pro_sekunde': (len(teilnehmer) + len(ergebnisse)) / dauer}
+
+    from test_modul import TESTERGEBNIS_SPALTEN, speichere_testergebnisse
+    zeilen = erzeuge_ergebnisse(len(teilnehmer), 1, seed=7)[TESTERGEBNIS_SPALTEN].head(EINZELNE_ZEILEN)
+    start = time.perf_counter()
+    for i in range(len(zeilen)):
+        with datenbank_modul.schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+            speichere_testergebnisse(cursor, zeilen.iloc[i:i + 1])
+    dauer = time.perf_counter() - start
+    return {
+        'einfuegen_block': ergebnisse_block,
+        'einfuegen_einzeln': {'sekunden': dauer, 'zeilen_pro_sekunde': len(zeilen) / dauer},
+    }
+
+def szenario_teilnehmerliste():
+    from teilnehmer_modul import ergaenze_alter_und_status, lade_teilnehmerseite, zaehle_teilnehmer
+
+    def liste():
+        # Ohne Cache messen: jeder Durchlauf entspricht dem ersten Aufruf nach einer Änderung
+        datenbank_modul.erhoehe_tabellenversion('teilnehmer')
+        anzahl = zaehle_teilnehmer(nur_aktive=False)
+        ergaenze_alter_und_status(lade_teilnehmerseite(0, sortierung='name', nur_aktive=False))
+        ergaenze_alter_und_status(lade_teilnehmerseite(max(0, (anzahl - 1) // 50), nur_aktive=False))
+        zaehle_teilnehmer(suchtext='Huber')
+        ergaenze_alter_und_status(lade_teilnehmerseite(0, suchtext='Huber'))
+    return {'teilnehmerliste': {'sekunden': miss(liste)}}
+
+def szenario_prognose_numpy():
+    from prognose_modul import erstelle_prognosen_batch
+
+    def batch():
+        datenbank_modul.erhoehe_tabellenversion('testergebnisse')
+        return erstelle_prognosen_batch(nur_aktive=False)
+    anzahl = batch()['teilnehmer_id'].nunique()
+    sekunden = miss(batch)
+    return {'prognose_numpy': {'sekunden': sekunden, 'teilnehmer': int(anzahl)}}
+
+def szenario_pycaret(teilnehmer_ids):
+    try:
+        from pycaret.regression import load_model
+    except ImportError:
+        return {'training': {'uebersprungen': "PyCaret nicht installiert"},
+                'prognose_pycaret': {'uebersprungen': "PyCaret nicht installiert"}}
+    from prognose_modul import erstelle_prognosedaten, generiere_prognosen
+    from training_modul import MODELL_NAME, trainiere_und_speichere
+
+    start = time.perf_counter()
+    trainiere_und_speichere()
+    training = time.perf_counter() - start
+    modell = load_model(MODELL_NAME, verbose=False)
+
+    def prognosen():
+        datenbank_modul.erhoehe_tabellenversion('testergebnisse')
+        for teilnehmer_id in teilnehmer_ids:
+            generiere_prognosen(modell, erstelle_prognosedaten(teilnehmer_id))
+    return {
+        'training': {'sekunden': training},
+        'prognose_pycaret': {'sekunden': miss(prognosen) / len(teilnehmer_ids), 'je': 'Teilnehmer'},
+    }
+
+def szenario_berichte(teilnehmer_ids):
+    from bericht_modul import generiere_excel_bericht, generiere_pdf_bericht
+    from datenbank_modul import lese_abfrage
+    from prognose_modul import trend_prognose
+
+    auftraege = []
+    for teilnehmer_id in teilnehmer_ids:
+        teilnehmer = lese_abfrage('SELECT * FROM teilnehmer WHERE id = ?', (teilnehmer_id,)).iloc[0]
+        testergebnisse = lese_abfrage('SELECT * FROM testergebnisse WHERE teilnehmer_id = ? ORDER BY test_datum',
+                                      (teilnehmer_id,))
+        auftraege.append((teilnehmer, testergebnisse, trend_prognose(testergebnisse)))
+
+    ergebnisse = {}
+    for szenario, generator in (('bericht_pdf', generiere_pdf_bericht), ('bericht_excel', generiere_excel_bericht)):
+        sekunden = miss(lambda: [generator(*auftrag) for auftrag in auftraege])
+        ergebnisse[szenario] = {'sekunden': sekunden / len(auftraege), 'je': 'Bericht'}
+    return ergebnisse
+
+def szenario_export():
+    from datenaustausch_modul import exportiere
+    return {
+        'export_csv': {'sekunden': miss(lambda: exportiere('testergebnisse', 'csv'), 1)},
+        'export_excel': {'sekunden': miss(lambda: exportiere('testergebnisse', 'xlsx'), 1)},
+    }
+
+def messe_groesse(anzahl_zeilen, mit_pycaret):
+    """Führt alle Szenarien auf einer frischen Datenbank mit `anzahl_zeilen` Testergebnissen aus."""
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        # Modell- und Statusdateien des Trainings landen im Arbeitsverzeichnis
+        vorher = os.getcwd(), datenbank_modul.DATENBANK_URL, datenbank_modul.datenbank_pfad
+        os.chdir(verzeichnis)
+        datenbank_modul.konfiguriere(pfad=os.path.join(verzeichnis, 'benchmark.db'))
+        try:
+            ergebnisse = szenario_einfuegen(anzahl_zeilen)
+            anzahl_teilnehmer = int(datenbank_modul.lese_abfrage('SELECT COUNT(*) AS n FROM teilnehmer')['n'].iloc[0])
+            stichprobe = np.random.default_rng(1).choice(
+                np.arange(1, anzahl_teilnehmer + 1), min(STICHPROBE, anzahl_teilnehmer), replace=False
+            ).tolist()
+            ergebnisse.update(szenario_teilnehmerliste())
+            ergebnisse.update(szenario_prognose_numpy())
+            if mit_pycaret:
+                ergebnisse.update(szenario_pycaret(stichprobe))
+            ergebnisse.update(szenario_berichte(stichprobe))
+            ergebnisse.update(szenario_export())
+        finally:
+            datenbank_modul.konfiguriere(url=vorher[1], pfad=vorher[2])
+            os.chdir(vorher[0])
+    return ergebnisse
+
+
+# Auswertung
+def git_stand():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJEKT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def vergleiche(alt, neu, toleranz):
+    """Gibt die Szenarien aus, die gegenüber `alt` um mehr als `toleranz` langsamer sind."""
+    regressionen = []
+    print(f"\n{'Größe':>8}  {'Szenario':<20}{'alt [s]':>12}{'neu [s]':>12}{'Faktor':>9}")
+    for groesse, szenarien in neu['ergebnisse'].items():
+        for szenario, werte in szenarien.items():
+            alter_wert = alt.get('ergebnisse', {}).get(groesse, {}).get(szenario, {}).get('sekunden')
+            if alter_wert is None or 'sekunden' not in werte:
+                continue
+            faktor = werte['sekunden'] / alter_wert if alter_wert > 0 else float('inf')
+            langsamer = faktor > 1 + toleranz and werte['sekunden'] - alter_wert > MIN_DIFFERENZ
+            markierung = '  LANGSAMER' if langsamer else ''
+            print(f"{groesse:>8}  {szenario:<20}{alter_wert:>12.4f}{werte['sekunden']:>12.4f}{faktor:>9.2f}{markierung}")
+            if markierung:
+                regressionen.append((groesse, szenario))
+    return regressionen
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groessen', default='1000,10000,100000', help="Anzahl der Testergebnisse, kommagetrennt")
+    parser.add_argument('--ohne-pycaret', action='store_true', help="Training und PyCaret-Prognose überspringen")
+    parser.add_argument('--json', help="Ergebnisse als JSON in diese Datei schreiben")
+    parser.add_argument('--vergleich', help="Frühere JSON-Ergebnisse zum Vergleich")
+    parser.add_argument('--toleranz', type=float, default=0.2, help="Erlaubte Verlangsamung (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    ergebnis = {
+        'meta': {
+            'zeitpunkt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git': git_stand(),
+            'python': platform.python_version(),
+            'plattform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'ergebnisse': {},
+    }
+    for groesse in (int(wert) for wert in args.groessen.split(',')):
+        szenarien = messe_groesse(groesse, not args.ohne_pycaret)
+        ergebnis['ergebnisse'][str(groesse)] = szenarien
+        print(f"\n{groesse} Testergebnisse")
+        for szenario, werte in szenarien.items():
+            if 'sekunden' in werte:
+                je = f" je {werte['je']}" if 'je' in werte else ''
+                print(f"  {szenario:<20}{werte['sekunden']:>12.4f} s{je}")
+            else:
+                print(f"  {szenario:<20}  übersprungen: {werte['uebersprungen']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as datei:
+            json.dump(ergebnis, datei, indent=2)
+
+    if args.vergleich:
+        with open(args.vergleich, encoding='utf-8') as datei:
+            regressionen = vergleiche(json.load(datei), ergebnis, args.toleranz)
+        if regressionen:
+            print(f"\n{len(regressionen)} Szenario(s) langsamer als erlaubt.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
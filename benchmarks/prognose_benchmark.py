@@ -0,0 +1,85 @@
+"""Vergleicht Trainingszeit und Genauigkeit der Prognose-Backends (NumPy-Trend vs. PyCaret).
+
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/prognose_benchmark.py --teilnehmer 500 --tests 8
+
+Je Teilnehmer wird der letzte Test zurückgehalten und aus den übrigen Tests
+vorhergesagt; verglichen wird der mittlere absolute Fehler von gesamt_prozent.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prognose_modul import trend_koeffizienten  # noqa: E402
+from testdaten import erzeuge_ergebnisse  # noqa: E402
+from training_modul import MERKMALE, PYCARET_MODELLE, ZIEL  # noqa: E402
+
+
+def teile_auf(ergebnisse):
+    """Trennt je Teilnehmer den letzten Test (Holdout) von der Historie."""
+    letzter = ergebnisse.groupby('teilnehmer_id')['test_datum'].transform('max') == ergebnisse['test_datum']
+    return ergebnisse[~letzter], ergebnisse[letzter].sort_values('teilnehmer_id')
+
+
+def benchmark_numpy(historie, holdout):
+    stichtag = pd.Timestamp('2024-01-01')
+    start = time.perf_counter()
+    teilnehmer_ids, achsenabschnitte, steigungen = trend_koeffizienten(historie, stichtag)
+    dauer = time.perf_counter() - start
+
+    holdout = holdout.set_index('teilnehmer_id').loc[teilnehmer_ids]
+    tag = (pd.to_datetime(holdout['test_datum']) - stichtag).dt.days.to_numpy()
+    vorhersage = np.clip(achsenabschnitte[:, -1] + steigungen[:, -1] * tag, 0, 100)
+    return dauer, float(np.mean(np.abs(vorhersage - holdout['gesamt_prozent'].to_numpy())))
+
+
+def benchmark_pycaret(historie, holdout):
+    from pycaret.regression import setup, compare_models, predict_model
+
+    start = time.perf_counter()
+    setup(data=historie[MERKMALE + [ZIEL]], target=ZIEL, session_id=123, verbose=False)
+    modell = compare_models(include=PYCARET_MODELLE or None, verbose=False)
+    dauer = time.perf_counter() - start
+
+    # Wie in der App: Vorhersage aus dem jeweils letzten bekannten Test
+    letzte = historie.sort_values('test_datum').groupby('teilnehmer_id').tail(1).sort_values('teilnehmer_id')
+    vorhersage = predict_model(modell, data=letzte[MERKMALE], verbose=False)['prediction_label'].to_numpy()
+    return dauer, float(np.mean(np.abs(vorhersage - holdout['gesamt_prozent'].to_numpy())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--teilnehmer', type=int, default=500)
+    parser.add_argument('--tests', type=int, default=8)
+    parser.add_argument('--ohne-pycaret', action='store_true', help="Nur das NumPy-Backend messen")
+    parser.add_argument('--json', help="Ergebnisse zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args()
+
+    historie, holdout = teile_auf(erzeuge_ergebnisse(args.teilnehmer, args.tests))
+    ergebnisse = {'numpy': benchmark_numpy(historie, holdout)}
+    if not args.ohne_pycaret:
+        try:
+            ergebnisse['pycaret'] = benchmark_pycaret(historie, holdout)
+        except ImportError:
+            print("PyCaret nicht installiert - übersprungen.")
+
+    print(f"{len(historie)} Trainingszeilen, {len(holdout)} Holdout-Tests")
+    print(f"{'Backend':<10}{'Fit-Zeit [s]':>14}{'MAE [%-Pkt.]':>14}")
+    for backend, (dauer, mae) in ergebnisse.items():
+        print(f"{backend:<10}{dauer:>14.4f}{mae:>14.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as datei:
+            json.dump({backend: {'fit_sekunden': dauer, 'mae': mae} for backend, (dauer, mae) in ergebnisse.items()},
+                      datei, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Misst Kaltstart und ersten Aufruf jeder Seite der Streamlit-App.
+
+Jede Messung läuft in einem frischen Python-Prozess (leere Modul-Caches):
+- Kaltstart: erster Lauf von MatheGUI.py (Startseite Teilnehmerverwaltung)
+- Erster Aufruf: Wechsel auf die jeweilige Seite direkt nach dem Kaltstart
+
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/startzeit_benchmark.py [--app pfad/zu/MatheGUI.py] [--wiederholungen 3]
+
+Für einen Vorher/Nachher-Vergleich das Skript mit --app auf einen Checkout
+des älteren Stands (z. B. per `git worktree add`) richten. Die Seitenliste
+wird aus der Navigation der jeweiligen App gelesen. Alle Läufe verwenden eine
+leere SQLite-Datenbank in einem temporären Verzeichnis (MATHE_DATENBANK);
+Stände ohne diese Einstellung nutzen weiterhin ihren festen Datenbankpfad.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJEKT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEITENCODE = '''
+import json
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=300).run()
+if app.exception:
+    raise SystemExit(f"Fehler beim Start der App: {{app.exception[0].value}}")
+print(json.dumps(list(app.sidebar.radio[0].options)))
+'''
+
+MESSCODE = '''
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file({app!r}, default_timeout=300).run()
+kaltstart = time.perf_counter() - start
+start = time.perf_counter()
+app.sidebar.radio[0].set_value({seite!r}).run()
+erster_aufruf = time.perf_counter() - start
+print(json.dumps({{"kaltstart": kaltstart, "erster_aufruf": erster_aufruf}}))
+'''
+
+
+def fuehre_aus(code, app, umgebung):
+    """Führt Code in einem frischen Interpreter aus und liest die letzte Ausgabezeile als JSON."""
+    ergebnis = subprocess.run(
+        [sys.executable, '-c', code], cwd=os.path.dirname(app), env=umgebung, capture_output=True, text=True,
+    )
+    if ergebnis.returncode != 0:
+        sys.exit(f"{app}: {ergebnis.stderr.strip().splitlines()[-1]}")
+    return json.loads(ergebnis.stdout.strip().splitlines()[-1])
+
+def seiten(app, umgebung):
+    """Liest die Seitennamen aus der Navigation der App (Optionen des Sidebar-Radios)."""
+    return fuehre_aus(SEITENCODE.format(app=app), app, umgebung)
+
+def miss(app, seite, umgebung):
+    """Führt eine Messung in einem frischen Interpreter aus."""
+    return fuehre_aus(MESSCODE.format(app=app, seite=seite), app, umgebung)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default=os.path.join(PROJEKT, 'MatheGUI.py'))
+    parser.add_argument('--wiederholungen', type=int, default=3)
+    parser.add_argument('--json', help="Ergebnisse zusätzlich als JSON in diese Datei schreiben")
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+
+    ergebnisse = {}
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        umgebung = {**os.environ, 'MATHE_DATENBANK': os.path.join(verzeichnis, 'startzeit.db')}
+        umgebung.pop('MATHE_DATENBANK_URL', None)
+        for seite in seiten(app, umgebung):
+            messungen = [miss(app, seite, umgebung) for _ in range(args.wiederholungen)]
+            ergebnisse[seite] = {
+                schluessel: statistics.median(messung[schluessel] for messung in messungen)
+                for schluessel in ('kaltstart', 'erster_aufruf')
+            }
+
+    print(f"App: {app} (Median aus {args.wiederholungen} Läufen)")
+    print(f"{'Seite':<22}{'Kaltstart [s]':>15}{'Erster Aufruf [s]':>19}")
+    for seite, werte in ergebnisse.items():
+        print(f"{seite:<22}{werte['kaltstart']:>15.3f}{werte['erster_aufruf']:>19.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as datei:
+            json.dump(ergebnisse, datei, indent=2)
+
+
+if __name__ == '__main__':
+    main()
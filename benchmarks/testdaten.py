@@ -0,0 +1,137 @@
+"""Erzeugt realistische synthetische Teilnehmer und Testergebnisse.
+
+- SV-Nummern im Format XXXXDDMMYY mit gültigem Geburtsdatum (16 bis 60 Jahre)
+- Testergebnisse in sechs Kategorien mit zusammen 100 Maximalpunkten,
+  linearem Lernfortschritt und Rauschen
+
+Aufruf aus dem Projektverzeichnis, z. B. zum Befüllen einer Entwicklungsdatenbank:
+    python benchmarks/testdaten.py --zeilen 10000 --datenbank /tmp/mathe_demo.db
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prognose_modul import KATEGORIEN, PROZENT_SPALTEN  # noqa: E402
+from teilnehmer_modul import TEILNEHMER_SPALTEN  # noqa: E402
+from test_modul import ERREICHT_SPALTEN, MAX_SPALTEN, TESTERGEBNIS_SPALTEN, berechne_prozente  # noqa: E402
+
+# Maximalpunkte je Kategorie (Summe 100)
+MAXIMALPUNKTE = [20, 15, 20, 15, 15, 15]
+
+VORNAMEN = ['Anna', 'Ben', 'Clara', 'David', 'Elif', 'Felix', 'Hannah', 'Jonas', 'Lea', 'Luca', 'Mia', 'Noah']
+NACHNAMEN = ['Bauer', 'Gruber', 'Huber', 'Kaya', 'Mayer', 'Novak', 'Schmid', 'Wagner', 'Weber', 'Yilmaz']
+BERUFSWUENSCHE = ['KOCH', 'ELEKTRIKER', 'FRISEUR', 'TISCHLER', 'BUEROKAUFMANN', 'LAGERLOGISTIK', 'PFLEGE', 'MECHATRONIK']
+
+# Abstand zwischen zwei Tests in Tagen
+TESTABSTAND = 14
+
+
+def erzeuge_sv_nummern(anzahl, rng, stichtag=pd.Timestamp('2026-01-01')):
+    """Eindeutige SV-Nummern XXXXDDMMYY; die letzten sechs Ziffern sind ein gültiges Geburtsdatum."""
+    nummern = pd.Series(dtype=str)
+    while len(nummern) < anzahl:
+        fehlend = anzahl - len(nummern)
+        laufnummern = rng.integers(1000, 10000, fehlend)
+        geburtstage = stichtag - pd.to_timedelta(rng.integers(16 * 365, 60 * 365, fehlend), unit='D')
+        neu = pd.Series(laufnummern.astype(str)) + pd.Series(geburtstage.strftime('%d%m%y'))
+        nummern = pd.concat([nummern, neu], ignore_index=True).drop_duplicates(ignore_index=True)
+    return nummern.to_numpy()
+
+
+def erzeuge_teilnehmer(anzahl, seed=42, stichtag=pd.Timestamp('2026-01-01')):
+    """Teilnehmer in Reihenfolge von TEILNEHMER_SPALTEN; etwa ein Drittel ist bereits ausgetreten."""
+    rng = np.random.default_rng(seed)
+    eintritt = stichtag - pd.to_timedelta(rng.integers(0, 540, anzahl), unit='D')
+    austritt = eintritt + pd.to_timedelta(rng.integers(180, 720, anzahl), unit='D')
+    teilnehmer = pd.DataFrame({
+        'name': [f"{vorname} {nachname}" for vorname, nachname in
+                 zip(rng.choice(VORNAMEN, anzahl), rng.choice(NACHNAMEN, anzahl))],
+        'sv_nummer': erzeuge_sv_nummern(anzahl, rng, stichtag),
+        'berufswunsch': rng.choice(BERUFSWUENSCHE, anzahl),
+        'eintrittsdatum': eintritt.strftime('%Y-%m-%d'),
+        'austrittsdatum': austritt.strftime('%Y-%m-%d'),
+    })
+    return teilnehmer[TEILNEHMER_SPALTEN]
+
+
+def erzeuge_ergebnisse(anzahl_teilnehmer, tests_pro_teilnehmer, seed=42, eintrittsdaten=None):
+    """Erzeugt Testreihen mit linearem Lernfortschritt plus Rauschen.
+
+    Ohne `eintrittsdaten` beginnen alle Testreihen am 08.01.2024.
+    """
+    rng = np.random.default_rng(seed)
+    n = anzahl_teilnehmer * tests_pro_teilnehmer
+    teilnehmer_ids = np.repeat(np.arange(1, anzahl_teilnehmer + 1), tests_pro_teilnehmer)
+    tage = np.tile(np.arange(tests_pro_teilnehmer) * TESTABSTAND, anzahl_teilnehmer) + rng.integers(0, 5, n)
+    start = rng.uniform(0.2, 0.6, (anzahl_teilnehmer, len(KATEGORIEN)))
+    fortschritt = rng.uniform(0.0, 0.004, (anzahl_teilnehmer, len(KATEGORIEN)))
+    anteil = start[teilnehmer_ids - 1] + fortschritt[teilnehmer_ids - 1] * tage[:, None]
+    anteil = np.clip(anteil + rng.normal(0, 0.05, anteil.shape), 0, 1)
+
+    if eintrittsdaten is None:
+        beginn = pd.DatetimeIndex(np.repeat(pd.Timestamp('2024-01-08'), n))
+    else:
+        beginn = pd.DatetimeIndex(pd.to_datetime(np.repeat(np.asarray(eintrittsdaten), tests_pro_teilnehmer)))
+    ergebnisse = pd.DataFrame({
+        'teilnehmer_id': teilnehmer_ids,
+        'test_datum': (beginn + pd.to_timedelta(tage, unit='D')).strftime('%Y-%m-%d'),
+    })
+    for (praefix, _), maximum, spalte in zip(KATEGORIEN, MAXIMALPUNKTE, anteil.T):
+        ergebnisse[f"{praefix}_erreicht"] = np.rint(spalte * maximum).astype(int)
+        ergebnisse[f"{praefix}_max"] = maximum
+    # Prozentwerte wie beim Speichern (test_modul.speichere_testergebnisse)
+    kategorien, ergebnisse['gesamt_prozent'] = berechne_prozente(ergebnisse[ERREICHT_SPALTEN], ergebnisse[MAX_SPALTEN])
+    ergebnisse[PROZENT_SPALTEN] = kategorien
+    return ergebnisse
+
+
+def als_zeilen(df):
+    """DataFrame als Tupel mit Python-Werten (die Datenbanktreiber binden keine NumPy-Typen)."""
+    return list(df.astype(object).itertuples(index=False, name=None))
+
+
+def fuelle_datenbank(anzahl_zeilen, tests_pro_teilnehmer=10, seed=42):
+    """Legt das Schema an und fügt Teilnehmer und rund `anzahl_zeilen` Testergebnisse ein.
+
+    Schreibt in das konfigurierte Backend (siehe datenbank_modul.konfiguriere);
+    die Teilnehmer-IDs der Ergebnisse setzen eine leere Datenbank voraus.
+    """
+    from datenbank_modul import schreib_transaktion
+    from migration_modul import migriere
+    from teilnehmer_modul import speichere_teilnehmer
+    from test_modul import speichere_testergebnisse
+
+    anzahl_teilnehmer = max(1, anzahl_zeilen // tests_pro_teilnehmer)
+    teilnehmer = erzeuge_teilnehmer(anzahl_teilnehmer, seed)
+    ergebnisse = erzeuge_ergebnisse(anzahl_teilnehmer, tests_pro_teilnehmer, seed, teilnehmer['eintrittsdatum'])
+
+    migriere()
+    with schreib_transaktion(aendert=('teilnehmer', 'testergebnisse')) as cursor:
+        speichere_teilnehmer(cursor, als_zeilen(teilnehmer))
+        speichere_testergebnisse(cursor, ergebnisse[TESTERGEBNIS_SPALTEN])
+    return teilnehmer, ergebnisse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zeilen', type=int, default=10000, help="Anzahl der Testergebnisse")
+    parser.add_argument('--tests', type=int, default=10, help="Tests pro Teilnehmer")
+    parser.add_argument('--datenbank', required=True, help="Pfad der (neuen) SQLite-Datei")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.datenbank):
+        parser.error(f"{args.datenbank} existiert bereits")
+    from datenbank_modul import konfiguriere
+    konfiguriere(pfad=args.datenbank)
+    teilnehmer, ergebnisse = fuelle_datenbank(args.zeilen, args.tests, args.seed)
+    print(f"{len(teilnehmer)} Teilnehmer und {len(ergebnisse)} Testergebnisse in {args.datenbank} angelegt")
+
+
+if __name__ == '__main__':
+    main()
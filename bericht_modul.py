@@ -1,53 +1,116 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
-from fpdf import FPDF
-import openpyxl
-from io import BytesIO
-from prognose_modul import lade_modell, erstelle_prognosedaten, generiere_prognosen
+import multiprocessing
 import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from prognose_modul import (
+    KATEGORIEN, PROGNOSE_BACKEND, PROGNOSE_SPALTEN, lade_modell, erstelle_prognose, erstelle_prognosen_batch,
+    trend_prognose,
+)
+from diagramm_modul import prognose_png, prognose_version, rendere_prognose_png
+from datenbank_modul import lese_abfrage, lese_abfrage_gecacht
+from metrik_modul import gemessen
+from teilnehmer_modul import zaehle_teilnehmer, waehle_teilnehmer
 
-# Absoluter Pfad zur Datenbank im temporären Verzeichnis
-datenbank_pfad = os.path.join('/tmp', 'mathematik_kurs.db')
+# Berichte pro Worker-Auftrag bei der Sammelerstellung
+BERICHTE_PRO_AUFTRAG = 25
 
-# Verbindung zur Datenbank
-verbindung = sqlite3.connect(datenbank_pfad, check_same_thread=False)
+# Diagramm im PDF: Breite, Höhe (Zoll) und Auflösung
+PDF_DIAGRAMM = (8, 4.5, 100)
+# Abstand der Tage in der Tabelle der Prognosewerte
+PROGNOSE_SCHRITT = 5
 
 # PDF-Bericht
-def generiere_pdf_bericht(teilnehmer, testergebnisse, prognosedaten):
+def _pdf_tabelle(pdf, kopf, zeilen, breiten):
+    """Kompakte Tabelle mit Rahmen (eine Zelle je Wert, 5 mm Zeilenhöhe)."""
+    pdf.set_font("Arial", size=7, style='B')
+    for text, breite in zip(kopf, breiten):
+        pdf.cell(breite, 5, txt=text, border=1, align='C')
+    pdf.ln()
+    pdf.set_font("Arial", size=8)
+    for zeile in zeilen:
+        for wert, breite in zip(zeile, breiten):
+            text = f"{wert:.1f}" if isinstance(wert, float) else str(wert)
+            pdf.cell(breite, 5, txt=text, border=1, align='R' if isinstance(wert, float) else 'L')
+        pdf.ln()
+
+@gemessen('bericht_pdf')
+def generiere_pdf_bericht(teilnehmer, testergebnisse, prognosedaten, diagramm=None, mit_diagramm=True):
+    """Erzeugt den PDF-Bericht im Speicher und gibt die Bytes zurück.
+
+    `diagramm` ist ein fertiges PNG der Prognose; ohne wird es hier gezeichnet
+    (Matplotlib, ca. 0,2 s). `mit_diagramm=False` lässt es weg.
+    """
+    from fpdf import FPDF
+    if mit_diagramm and diagramm is None:
+        diagramm = rendere_prognose_png(prognosedaten, *PDF_DIAGRAMM)
+
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
 
     # Titel
     pdf.set_font("Arial", size=14, style='B')
-    pdf.cell(200, 10, txt=f"Bericht für {teilnehmer['name']}", ln=True, align='C')
+    pdf.cell(0, 10, txt=f"Bericht für {teilnehmer['name']}", ln=True, align='C')
 
     # Teilnehmerdaten
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Teilnehmerdaten:", ln=True)
-    pdf.cell(200, 10, txt=f"SV-Nummer: {teilnehmer['sv_nummer']}", ln=True)
-    pdf.cell(200, 10, txt=f"Berufswunsch: {teilnehmer['berufswunsch']}", ln=True)
-    pdf.cell(200, 10, txt=f"Eintrittsdatum: {teilnehmer['eintrittsdatum']}", ln=True)
-    pdf.cell(200, 10, txt=f"Austrittsdatum: {teilnehmer['austrittsdatum']}", ln=True)
+    pdf.set_font("Arial", size=11, style='B')
+    pdf.cell(0, 7, txt="Teilnehmerdaten", ln=True)
+    _pdf_tabelle(pdf, ["Name", "SV-Nummer", "Berufswunsch", "Eintrittsdatum", "Austrittsdatum"], [[
+        teilnehmer['name'], teilnehmer['sv_nummer'], teilnehmer['berufswunsch'],
+        teilnehmer['eintrittsdatum'], teilnehmer['austrittsdatum'],
+    ]], [50, 30, 40, 35, 35])
 
-    # Testergebnisse
-    pdf.cell(200, 10, txt="Testergebnisse:", ln=True)
-    for _, row in testergebnisse.iterrows():
-        pdf.cell(200, 10, txt=f"Testdatum: {row['test_datum']}, Gesamtprozent: {row['gesamt_prozent']:.2f}%", ln=True)
+    # Testergebnisse in Prozent je Kategorie
+    kopf = [anzeigename for _, anzeigename in KATEGORIEN] + ["Gesamt"]
+    breiten = [22] * len(KATEGORIEN) + [18]
+    testergebnisse = testergebnisse.sort_values('test_datum')
+    prozente = testergebnisse[PROGNOSE_SPALTEN].astype(float)
+    pdf.ln(3)
+    pdf.set_font("Arial", size=11, style='B')
+    pdf.cell(0, 7, txt="Testergebnisse (%)", ln=True)
+    _pdf_tabelle(pdf, ["Testdatum"] + kopf, [
+        [datum] + werte for datum, werte in zip(testergebnisse['test_datum'], prozente[PROGNOSE_SPALTEN].to_numpy().tolist())
+    ], [22] + breiten)
 
-    # Prognose
-    pdf.cell(200, 10, txt="Prognosedaten:", ln=True)
-    for index, row in prognosedaten.iterrows():
-        pdf.cell(200, 10, txt=f"Tag {row['Tage']}: {row['gesamt_prozent']:.2f}%", ln=True)
+    # Prognose als Diagramm; fpdf 1.7 bettet Bilder nur aus Dateien ein
+    if mit_diagramm:
+        pdf.ln(3)
+        pdf.set_font("Arial", size=11, style='B')
+        pdf.cell(0, 7, txt="Prognose", ln=True)
+        handle, bildpfad = tempfile.mkstemp(suffix='.png')
+        try:
+            with os.fdopen(handle, 'wb') as bild:
+                bild.write(diagramm)
+            pdf.image(bildpfad, w=180, type='PNG')
+        finally:
+            os.remove(bildpfad)
+
+    # Prognosewerte in 5-Tage-Schritten
+    auszug = prognosedaten[prognosedaten['Tage'] % PROGNOSE_SCHRITT == 0]
+    pdf.ln(3)
+    pdf.set_font("Arial", size=11, style='B')
+    pdf.cell(0, 7, txt="Prognosewerte (%)", ln=True)
+    _pdf_tabelle(pdf, ["Tag"] + kopf, [
+        [int(tag)] + werte for tag, werte in zip(auszug['Tage'], auszug[PROGNOSE_SPALTEN].to_numpy().tolist())
+    ], [22] + breiten)
+
+    # PDF im Speicher erzeugen statt im Arbeitsverzeichnis
+    return pdf.output(dest='S').encode('latin-1')
 
-    # PDF speichern
-    dateiname = f"{teilnehmer['name']}-Bericht.pdf"
-    pdf.output(dateiname)
-    return dateiname
+@st.cache_data(max_entries=128, show_spinner=False)
+def pdf_bericht_gecacht(teilnehmer, testergebnisse, prognosedaten):
+    """PDF-Bericht, gecacht bis sich Teilnehmer, Testergebnisse oder Prognose ändern (Inhaltsschlüssel)."""
+    diagramm = prognose_png(int(teilnehmer['id']), prognose_version(prognosedaten), prognosedaten, *PDF_DIAGRAMM)
+    return generiere_pdf_bericht(teilnehmer, testergebnisse, prognosedaten, diagramm)
 
 # Excel-Bericht
+@gemessen('bericht_excel')
 def generiere_excel_bericht(teilnehmer, testergebnisse, prognosedaten):
+    import openpyxl
     workbook = openpyxl.Workbook()
     sheet = workbook.active
     sheet.title = f"Bericht {teilnehmer['name']}"
@@ -64,60 +127,145 @@ def generiere_excel_bericht(teilnehmer, testergebnisse, prognosedaten):
     sheet.append([])
     sheet.append(["Testergebnisse"])
     sheet.append(["Testdatum", "Gesamtprozent"])
-    for _, row in testergebnisse.iterrows():
-        sheet.append([row['test_datum'], row['gesamt_prozent']])
+    for zeile in zip(testergebnisse['test_datum'], testergebnisse['gesamt_prozent']):
+        sheet.append(list(zeile))
 
     # Prognose
     sheet.append([])
     sheet.append(["Prognosedaten"])
     sheet.append(["Tag", "Gesamtprozent"])
-    for _, row in prognosedaten.iterrows():
-        sheet.append([row['Tage'], row['gesamt_prozent']])
+    for zeile in zip(prognosedaten['Tage'].tolist(), prognosedaten['gesamt_prozent'].tolist()):
+        sheet.append(list(zeile))
 
     # Excel speichern
-    dateiname = f"{teilnehmer['name']}-Bericht.xlsx"
     with BytesIO() as b:
         workbook.save(b)
         b.seek(0)
         return b.getvalue()
 
+# Sammelberichte
+def _erzeuge_berichte(auftraege, formate, mit_diagramm=True):
+    """Erzeugt die Berichte eines Auftragspakets (läuft im Worker-Prozess)."""
+    generatoren = {
+        'pdf': lambda *daten: generiere_pdf_bericht(*daten, mit_diagramm=mit_diagramm),
+        'xlsx': generiere_excel_bericht,
+    }
+    ergebnisse, fehler = [], []
+    for teilnehmer, testergebnisse, prognosedaten in auftraege:
+        for format in formate:
+            dateiname = f"{teilnehmer['id']}-{teilnehmer['name']}-Bericht.{format}"
+            try:
+                ergebnisse.append((dateiname, generatoren[format](teilnehmer, testergebnisse, prognosedaten)))
+            except Exception as e:
+                fehler.append(f"{dateiname}: {e}")
+    return ergebnisse, fehler
+
+@gemessen('berichte_alle')
+def generiere_alle_berichte(formate=('pdf',), modell=None, max_worker=None, mit_diagramm=True):
+    """Erstellt Berichte für alle Teilnehmer parallel und packt sie in ein ZIP im Speicher.
+
+    Gibt (ZIP-Bytes, Statistik) zurück; die Statistik enthält Anzahl, Dauer,
+    Durchsatz (Berichte/s) und Fehlermeldungen einzelner Berichte.
+    """
+    start = time.perf_counter()
+    teilnehmer_df = lese_abfrage('SELECT * FROM teilnehmer ORDER BY id')
+    testergebnisse_df = lese_abfrage('SELECT * FROM testergebnisse ORDER BY teilnehmer_id, test_datum')
+    # Eine gemeinsame Prognoserechnung für alle Berichte
+    prognosen = erstelle_prognosen_batch(modell, nur_aktive=False)
+
+    ergebnisse_je_teilnehmer = dict(tuple(testergebnisse_df.groupby('teilnehmer_id')))
+    prognosen_je_teilnehmer = dict(tuple(prognosen[['teilnehmer_id', 'Tage'] + PROGNOSE_SPALTEN].groupby('teilnehmer_id')))
+    auftraege = [
+        (teilnehmer, ergebnisse_je_teilnehmer[teilnehmer['id']], prognosen_je_teilnehmer[teilnehmer['id']])
+        for teilnehmer in teilnehmer_df.to_dict('records')
+        if teilnehmer['id'] in ergebnisse_je_teilnehmer and teilnehmer['id'] in prognosen_je_teilnehmer
+    ]
+    pakete = [auftraege[i:i + BERICHTE_PRO_AUFTRAG] for i in range(0, len(auftraege), BERICHTE_PRO_AUFTRAG)]
+
+    anzahl, alle_fehler = 0, []
+    puffer = BytesIO()
+    with zipfile.ZipFile(puffer, 'w', zipfile.ZIP_DEFLATED) as archiv:
+        if pakete:
+            # "spawn": keine geerbten SQLite-Verbindungen oder Streamlit-Threads im Worker
+            with ProcessPoolExecutor(max_workers=max_worker, mp_context=multiprocessing.get_context('spawn')) as pool:
+                jobs = [pool.submit(_erzeuge_berichte, paket, tuple(formate), mit_diagramm) for paket in pakete]
+                # Fertige Pakete sofort ins Archiv schreiben statt alle Berichte zu sammeln
+                for job in as_completed(jobs):
+                    berichte, fehler = job.result()
+                    for dateiname, inhalt in berichte:
+                        archiv.writestr(dateiname, inhalt)
+                    anzahl += len(berichte)
+                    alle_fehler.extend(fehler)
+
+    dauer = time.perf_counter() - start
+    statistik = {
+        'anzahl': anzahl,
+        'dauer': dauer,
+        'durchsatz': anzahl / dauer if dauer > 0 else 0.0,
+        'fehler': alle_fehler,
+    }
+    return puffer.getvalue(), statistik
+
 # Berichtswesen
 def berichtswesen():
     st.header("Berichtswesen")
 
     # Teilnehmerdaten abrufen
-    teilnehmer_df = pd.read_sql_query('SELECT * FROM teilnehmer', verbindung)
-    if teilnehmer_df.empty:
+    if zaehle_teilnehmer(nur_aktive=False) == 0:
         st.warning("Keine Teilnehmer vorhanden. Bitte zuerst Teilnehmer hinzufügen.")
         return
 
+    # Berichte für alle Teilnehmer
+    with st.expander("Berichte für alle Teilnehmer"):
+        formate = st.multiselect("Formate", ['pdf', 'xlsx'], default=['pdf'])
+        # Das Diagramm kostet je PDF-Bericht ein Vielfaches der übrigen Erstellung
+        mit_diagramm = st.checkbox("Prognosediagramm in PDF-Berichte einbetten", value=True)
+        if st.button("Alle Berichte erstellen", disabled=not formate):
+            modell = lade_modell() if PROGNOSE_BACKEND == 'pycaret' else None
+            if PROGNOSE_BACKEND == 'pycaret' and modell is None:
+                st.error("Prognosedaten konnten nicht erstellt werden.")
+            else:
+                with st.spinner("Berichte werden erstellt..."):
+                    archiv, statistik = generiere_alle_berichte(formate, modell, mit_diagramm=mit_diagramm)
+                st.success(
+                    f"{statistik['anzahl']} Berichte in {statistik['dauer']:.1f} s erstellt "
+                    f"({statistik['durchsatz']:.1f} Berichte/s)."
+                )
+                for meldung in statistik['fehler']:
+                    st.warning(meldung)
+                st.download_button(label="ZIP herunterladen", data=archiv, file_name="Berichte.zip")
+
     # Teilnehmer auswählen
-    teilnehmer_df['Auswahl'] = teilnehmer_df.apply(lambda x: f"{x['name']} (ID: {x['id']})", axis=1)
-    ausgewaehlter = st.selectbox("Teilnehmer auswählen", teilnehmer_df['Auswahl'])
-    teilnehmer_id = int(ausgewaehlter.split("ID: ")[1].strip(')'))
-    teilnehmer = teilnehmer_df[teilnehmer_df['id'] == teilnehmer_id].iloc[0]
+    auswahl = waehle_teilnehmer()
+    if auswahl is None:
+        return
+    teilnehmer_id, _ = auswahl
+    teilnehmer = lese_abfrage_gecacht('SELECT * FROM teilnehmer WHERE id = ?', (teilnehmer_id,), ('teilnehmer',)).iloc[0]
 
     # Testergebnisse abrufen
-    testergebnisse_df = pd.read_sql_query(f'SELECT * FROM testergebnisse WHERE teilnehmer_id = {teilnehmer_id}', verbindung)
+    testergebnisse_df = lese_abfrage_gecacht('SELECT * FROM testergebnisse WHERE teilnehmer_id = ? ORDER BY test_datum',
+                                             (teilnehmer_id,), ('testergebnisse',))
     if testergebnisse_df.empty:
         st.error("Keine Testergebnisse für diesen Teilnehmer vorhanden.")
         return
 
     # Prognosedaten abrufen
-    modell = lade_modell()
     prognosedaten = None
-    if modell:
-        daten = erstelle_prognosedaten(teilnehmer_id)
-        if daten is not None:
-            vorhersagen = generiere_prognosen(modell, daten)
-            prognosedaten = vorhersagen[['Tage', 'gesamt_prozent']]
+    modell = None
+    if PROGNOSE_BACKEND == 'pycaret':
+        modell = lade_modell()
+        vorhersagen = erstelle_prognose(teilnehmer_id, modell) if modell else None
+    else:
+        # Trendprognose direkt aus den bereits geladenen Testergebnissen
+        vorhersagen = trend_prognose(testergebnisse_df)
+    if vorhersagen is not None:
+        prognosedaten = vorhersagen[['Tage'] + PROGNOSE_SPALTEN].reset_index(drop=True)
 
     # PDF-Bericht generieren
     if st.button("PDF-Bericht erstellen"):
         if prognosedaten is not None:
-            pdf_dateiname = generiere_pdf_bericht(teilnehmer, testergebnisse_df, prognosedaten)
-            with open(pdf_dateiname, "rb") as pdf_file:
-                st.download_button(label="PDF herunterladen", data=pdf_file, file_name=pdf_dateiname)
+            pdf_inhalt = pdf_bericht_gecacht(teilnehmer, testergebnisse_df, prognosedaten)
+            st.download_button(label="PDF herunterladen", data=pdf_inhalt, file_name=f"{teilnehmer['name']}-Bericht.pdf")
         else:
             st.error("Prognosedaten konnten nicht erstellt werden.")
 
@@ -0,0 +1,263 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import codecs
+import time
+import zipfile
+from datetime import datetime
+from io import BytesIO, StringIO
+from datenbank_modul import lese_abfrage, lese_bloecke, schreib_transaktion
+from teilnehmer_modul import TEILNEHMER_SPALTEN, speichere_teilnehmer
+from test_modul import ERREICHT_SPALTEN, MAX_SPALTEN, TESTERGEBNIS_SPALTEN, pruefe_punkte, speichere_testergebnisse
+from prognose_modul import pruefe_nachtraining
+from protokoll_modul import MAX_AENDERUNGEN, lese_aenderungen, letzte_sequenz
+
+# Zeilen pro Block beim Einlesen und Exportieren
+BLOCKGROESSE = 10000
+
+# Exportierbare Tabellen
+EXPORT_TABELLEN = ['teilnehmer', 'testergebnisse']
+
+# Kodierungen für CSV-Dateien in Prüfreihenfolge (Excel speichert "CSV" unter deutschem Windows als cp1252)
+CSV_KODIERUNGEN = ['utf-8-sig', 'cp1252']
+
+
+# Einlesen
+def _erkenne_kodierung(datei):
+    """Erste Kodierung aus CSV_KODIERUNGEN, mit der sich die ganze Datei dekodieren lässt (sonst latin-1).
+
+    Die Datei wird vorab vollständig geprüft, damit ein Fehler nicht erst mitten im Import auftritt.
+    """
+    for kodierung in CSV_KODIERUNGEN:
+        dekodierer = codecs.getincrementaldecoder(kodierung)()
+        datei.seek(0)
+        try:
+            for stueck in iter(lambda: datei.read(1 << 20), b''):
+                dekodierer.decode(stueck)
+            dekodierer.decode(b'', final=True)
+        except UnicodeDecodeError:
+            continue
+        datei.seek(0)
+        return kodierung
+    datei.seek(0)
+    return 'latin-1'
+
+def lese_in_bloecken(datei, dateiname, blockgroesse=BLOCKGROESSE):
+    """Liest eine CSV- oder Excel-Datei blockweise; alle Werte zunächst als Text."""
+    if dateiname.lower().endswith(('.xlsx', '.xlsm')):
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            arbeitsmappe = openpyxl.load_workbook(datei, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+            # Beschädigte oder umbenannte Datei (keine gültige Excel-Arbeitsmappe)
+            raise ValueError(f"Die Datei {dateiname} ist keine gültige Excel-Datei: {e}") from e
+        zeilen = arbeitsmappe.active.iter_rows(values_only=True)
+        kopf = [str(wert).strip() for wert in next(zeilen, ())]
+        block = []
+        for zeile in zeilen:
+            block.append([
+                '' if wert is None else wert.date().isoformat() if isinstance(wert, datetime) else str(wert)
+                for wert in zeile
+            ])
+            if len(block) == blockgroesse:
+                yield pd.DataFrame(block, columns=kopf)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=kopf)
+        arbeitsmappe.close()
+    else:
+        # Trennzeichen anhand des Dateianfangs erkennen (Excel speichert deutsche CSVs mit ";")
+        anfang = datei.read(4096)
+        datei.seek(0)
+        kodierung = None
+        if isinstance(anfang, str):
+            anfang = anfang.encode('utf-8')
+        else:
+            kodierung = _erkenne_kodierung(datei)
+        trennzeichen = ';' if anfang.count(b';') > anfang.count(b',') else ','
+        # dtype=str: SV-Nummern mit führenden Nullen bleiben erhalten
+        yield from pd.read_csv(datei, sep=trennzeichen, encoding=kodierung, chunksize=blockgroesse, dtype=str,
+                               keep_default_na=False)
+
+def _normalisiere_datum(werte):
+    """Wandelt Datumstexte (YYYY-MM-DD oder TT.MM.JJJJ) in ISO-Texte um; ungültige werden NaN."""
+    werte = werte.str.strip()
+    iso = pd.to_datetime(werte, format='%Y-%m-%d', errors='coerce')
+    deutsch = pd.to_datetime(werte, format='%d.%m.%Y', errors='coerce')
+    return iso.fillna(deutsch).dt.strftime('%Y-%m-%d')
+
+def _fehlerbericht(block, regeln, zeilen_offset):
+    """Sammelt je Zeile die verletzten Regeln; gibt (gültige Maske, Fehler-DataFrame) zurück."""
+    fehler = pd.Series('', index=block.index)
+    for maske, meldung in regeln:
+        fehler = fehler.where(~maske, fehler + meldung + '; ')
+    ungueltig = fehler != ''
+    bericht = pd.DataFrame({
+        # Zeilennummer in der Datei (Kopfzeile = 1)
+        'zeile': np.flatnonzero(ungueltig.to_numpy()) + zeilen_offset + 2,
+        'fehler': fehler[ungueltig].str.rstrip('; ').to_numpy(),
+    })
+    return ~ungueltig, bericht
+
+def _pruefe_spalten(block, erwartet):
+    fehlend = [spalte for spalte in erwartet if spalte not in block.columns]
+    if fehlend:
+        raise ValueError(f"Fehlende Spalten: {', '.join(fehlend)}")
+
+def pruefe_teilnehmer(block, vorhandene_sv_nummern, zeilen_offset=0):
+    """Validiert einen Block Teilnehmer vektorisiert; gibt (gültige Zeilen, Fehlerbericht) zurück."""
+    _pruefe_spalten(block, TEILNEHMER_SPALTEN)
+    daten = block[TEILNEHMER_SPALTEN].apply(lambda spalte: spalte.str.strip())
+    daten['eintrittsdatum'] = _normalisiere_datum(daten['eintrittsdatum'])
+    daten['austrittsdatum'] = _normalisiere_datum(daten['austrittsdatum'])
+    sv = daten['sv_nummer']
+    geburtsdatum = pd.to_datetime(sv.str[4:10], format='%d%m%y', errors='coerce')
+
+    regeln = [
+        (daten['name'] == '', "Name fehlt"),
+        (~sv.str.fullmatch(r'\d{10}'), "Die SV-Nummer muss aus genau 10 Ziffern bestehen"),
+        (sv.str.fullmatch(r'\d{10}') & geburtsdatum.isna(), "SV-Nummer enthält kein gültiges Geburtsdatum (DDMMYY)"),
+        (sv.isin(vorhandene_sv_nummern), "SV-Nummer bereits vorhanden"),
+        (sv.duplicated(), "SV-Nummer mehrfach in der Datei"),
+        (~daten['berufswunsch'].str.isupper(), "Berufswunsch muss in Großbuchstaben eingegeben werden"),
+        (daten['eintrittsdatum'].isna(), "Ungültiges Eintrittsdatum"),
+        (daten['austrittsdatum'].isna(), "Ungültiges Austrittsdatum"),
+    ]
+    gueltig, bericht = _fehlerbericht(daten, regeln, zeilen_offset)
+    return daten[gueltig], bericht
+
+def pruefe_testergebnisse(block, vorhandene_teilnehmer_ids, zeilen_offset=0):
+    """Validiert einen Block Testergebnisse vektorisiert; gibt (gültige Zeilen, Fehlerbericht) zurück."""
+    _pruefe_spalten(block, TESTERGEBNIS_SPALTEN[:-1])
+    daten = pd.DataFrame(index=block.index)
+    daten['teilnehmer_id'] = pd.to_numeric(block['teilnehmer_id'].str.strip(), errors='coerce')
+    daten['test_datum'] = _normalisiere_datum(block['test_datum'])
+    punkte = block[ERREICHT_SPALTEN + MAX_SPALTEN].apply(lambda spalte: pd.to_numeric(spalte.str.strip(), errors='coerce'))
+    werte = punkte.to_numpy(dtype=float)
+    erreicht, maximum = werte[:, :len(ERREICHT_SPALTEN)], werte[:, len(ERREICHT_SPALTEN):]
+
+    regeln = [
+        (daten['teilnehmer_id'].isna(), "Ungültige Teilnehmer-ID"),
+        (daten['teilnehmer_id'].notna() & ~daten['teilnehmer_id'].isin(vorhandene_teilnehmer_ids), "Teilnehmer existiert nicht"),
+        (daten['test_datum'].isna(), "Ungültiges Testdatum"),
+    ] + [(pd.Series(maske, index=block.index), meldung) for maske, meldung in pruefe_punkte(erreicht, maximum)]
+    gueltig, bericht = _fehlerbericht(daten, regeln, zeilen_offset)
+
+    daten = pd.concat([daten, punkte], axis=1)[gueltig]
+    daten[ERREICHT_SPALTEN + MAX_SPALTEN] = daten[ERREICHT_SPALTEN + MAX_SPALTEN].astype(int)
+    daten['teilnehmer_id'] = daten['teilnehmer_id'].astype(int)
+    return daten[TESTERGEBNIS_SPALTEN[:-1]], bericht
+
+def importiere(datei, dateiname, tabelle, blockgroesse=BLOCKGROESSE):
+    """Importiert Teilnehmer oder Testergebnisse blockweise in einer einzigen Transaktion.
+
+    Ungültige Zeilen werden übersprungen und im Fehlerbericht aufgeführt.
+    Gibt (Anzahl importierter Zeilen, Fehlerbericht, Dauer in Sekunden) zurück.
+    """
+    start = time.perf_counter()
+    if tabelle == 'teilnehmer':
+        vorhanden = set(lese_abfrage('SELECT sv_nummer FROM teilnehmer')['sv_nummer'])
+    else:
+        vorhanden = set(lese_abfrage('SELECT id FROM teilnehmer')['id'])
+
+    importiert, berichte, zeilen_offset = 0, [], 0
+    with schreib_transaktion(aendert=(tabelle,)) as cursor:
+        for block in lese_in_bloecken(datei, dateiname, blockgroesse):
+            block.columns = [str(spalte).strip().lower() for spalte in block.columns]
+            block = block.reset_index(drop=True)
+            if tabelle == 'teilnehmer':
+                gueltig, bericht = pruefe_teilnehmer(block, vorhanden, zeilen_offset)
+                speichere_teilnehmer(cursor, gueltig.itertuples(index=False, name=None))
+                vorhanden.update(gueltig['sv_nummer'])
+            else:
+                gueltig, bericht = pruefe_testergebnisse(block, vorhanden, zeilen_offset)
+                speichere_testergebnisse(cursor, gueltig)
+            importiert += len(gueltig)
+            berichte.append(bericht)
+            zeilen_offset += len(block)
+
+    if tabelle == 'testergebnisse' and importiert:
+        pruefe_nachtraining()
+
+    fehlerbericht = pd.concat(berichte, ignore_index=True) if berichte else pd.DataFrame(columns=['zeile', 'fehler'])
+    return importiert, fehlerbericht, time.perf_counter() - start
+
+
+# Exportieren
+def exportiere(tabelle, format='csv', blockgroesse=BLOCKGROESSE):
+    """Exportiert eine Tabelle blockweise als CSV- oder Excel-Datei (Bytes)."""
+    if tabelle not in EXPORT_TABELLEN:
+        raise ValueError(f"Unbekannte Tabelle: {tabelle}")
+    bloecke = lese_bloecke(f'SELECT * FROM {tabelle} ORDER BY id', blockgroesse=blockgroesse)
+
+    if format == 'xlsx':
+        import openpyxl
+        # write_only: Zeilen werden direkt serialisiert statt als Zellobjekte gehalten
+        arbeitsmappe = openpyxl.Workbook(write_only=True)
+        blatt = arbeitsmappe.create_sheet(tabelle)
+        for nummer, block in enumerate(bloecke):
+            if nummer == 0:
+                blatt.append(list(block.columns))
+            for zeile in block.itertuples(index=False, name=None):
+                blatt.append(list(zeile))
+        with BytesIO() as b:
+            arbeitsmappe.save(b)
+            return b.getvalue()
+
+    puffer = StringIO()
+    for nummer, block in enumerate(bloecke):
+        block.to_csv(puffer, index=False, header=nummer == 0)
+    return puffer.getvalue().encode('utf-8')
+
+def exportiere_aenderungen(seit_seq=0, limit=MAX_AENDERUNGEN):
+    """Exportiert Änderungen mit seq > seit_seq als JSON Lines (eine Änderung je Zeile).
+
+    Gibt (Bytes, höchste enthaltene seq) zurück; die seq ist der Startwert für den nächsten Abruf.
+    """
+    aenderungen = lese_aenderungen(seit_seq, limit)
+    if aenderungen.empty:
+        return b'', seit_seq
+    return aenderungen.to_json(orient='records', lines=True, force_ascii=False).encode('utf-8'), int(aenderungen['seq'].max())
+
+
+# Datenaustausch
+def datenaustausch():
+    st.header("Import / Export")
+
+    # Import
+    st.subheader("Daten importieren")
+    tabelle = st.radio("Datenart", EXPORT_TABELLEN, format_func=lambda t: t.capitalize(), horizontal=True)
+    erwartet = TEILNEHMER_SPALTEN if tabelle == 'teilnehmer' else TESTERGEBNIS_SPALTEN[:-1]
+    st.caption(f"Erwartete Spalten: {', '.join(erwartet)}")
+    datei = st.file_uploader("CSV- oder Excel-Datei", type=['csv', 'xlsx'])
+
+    if datei is not None and st.button("Importieren"):
+        try:
+            importiert, fehlerbericht, dauer = importiere(datei, datei.name, tabelle)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success(f"{importiert} Zeilen in {dauer:.2f} s importiert ({importiert / max(dauer, 1e-9):,.0f} Zeilen/s).")
+            if not fehlerbericht.empty:
+                st.warning(f"{len(fehlerbericht)} Zeilen wurden wegen Fehlern übersprungen.")
+                st.dataframe(fehlerbericht)
+                st.download_button("Fehlerbericht herunterladen", fehlerbericht.to_csv(index=False).encode('utf-8'),
+                                   file_name=f"{tabelle}-fehlerbericht.csv")
+
+    # Export
+    st.subheader("Daten exportieren")
+    export_tabelle = st.selectbox("Tabelle", EXPORT_TABELLEN)
+    export_format = st.selectbox("Format", ['csv', 'xlsx'])
+    if st.button("Export erstellen"):
+        st.download_button("Export herunterladen", exportiere(export_tabelle, export_format),
+                           file_name=f"{export_tabelle}.{export_format}")
+
+    # Änderungen
+    st.subheader("Änderungen abrufen")
+    st.caption(f"Letzte Sequenznummer: {letzte_sequenz()}")
+    seit_seq = st.number_input("Änderungen nach Sequenznummer", min_value=0, step=1)
+    if st.button("Änderungen exportieren"):
+        inhalt, naechste_seq = exportiere_aenderungen(int(seit_seq))
+        st.download_button("Änderungen herunterladen", inhalt, file_name=f"aenderungen-{naechste_seq}.jsonl")
+        st.caption(f"Nächster Abruf ab Sequenznummer {naechste_seq} (höchstens {MAX_AENDERUNGEN} Änderungen je Abruf).")
@@ -0,0 +1,313 @@
+import sqlite3
+import threading
+import queue
+import time
+import pandas as pd
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+import os
+from metrik_modul import span
+
+# Speicher-Backend: SQLAlchemy-URL einer Server-Datenbank (z. B. postgresql+psycopg://...)
+# oder leer für eine lokale SQLite-Datei unter datenbank_pfad
+DATENBANK_URL = os.environ.get('MATHE_DATENBANK_URL', '')
+datenbank_pfad = os.environ.get('MATHE_DATENBANK', os.path.join('/tmp', 'mathematik_kurs.db'))
+
+# Anzahl der Leseverbindungen im Pool
+POOL_GROESSE = 8
+
+# Pragmas für jede neue Verbindung
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',        # Parallele Leser neben einem Schreiber
+    'PRAGMA synchronous = NORMAL',      # Im WAL-Modus sicher und deutlich schneller
+    'PRAGMA cache_size = -16000',       # ca. 16 MB Seiten-Cache pro Verbindung
+    'PRAGMA mmap_size = 268435456',     # 256 MB Memory-Mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',       # Kurz auf Schreibsperren warten statt Fehler
+]
+
+# Schlüssel der PostgreSQL-Advisory-Sperre, die Schreiber aller Instanzen serialisiert
+SCHREIB_SPERRE_SCHLUESSEL = 4711
+
+# Abfrage-Cache: maximale Einträge (LRU) und Lebensdauer in Sekunden
+CACHE_MAX_EINTRAEGE = 256
+CACHE_TTL = 300
+
+_speicher = None
+_speicher_sperre = threading.Lock()
+_schreib_sperre = threading.Lock()
+
+# (SQL, Parameter) -> (Zeitpunkt, Tabellenversionen, DataFrame)
+_abfrage_cache = OrderedDict()
+_cache_sperre = threading.Lock()
+# Wird nach jedem erfolgreichen Schreibzugriff auf eine Tabelle erhöht
+_tabellen_versionen = defaultdict(int)
+
+
+class DatenbankFehler(Exception):
+    """Fehler des Datenbanktreibers, unabhängig vom gewählten Backend."""
+
+
+# Speicher-Backends
+class SqliteSpeicher:
+    """Lokale SQLite-Datei: Pool von Leseverbindungen und ein einzelner Schreiber."""
+
+    dialekt = 'sqlite'
+    paramstyle = 'qmark'
+    fehler = sqlite3.Error
+    # Nur dieser Prozess schreibt; der Abfrage-Cache verlässt sich auf _tabellen_versionen
+    geteilt = False
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self._lese_pool = queue.LifoQueue(maxsize=POOL_GROESSE)
+        self._schreib_verbindung = None
+
+    def _oeffne_verbindung(self, nur_lesen=False):
+        """Öffnet eine neue Verbindung mit den abgestimmten Pragmas."""
+        # isolation_level=None: Transaktionen werden explizit gesteuert,
+        # cached_statements: parametrisierte Statements bleiben pro Verbindung vorbereitet
+        verbindung = sqlite3.connect(
+            self.pfad, check_same_thread=False, isolation_level=None, cached_statements=256
+        )
+        for pragma in PRAGMAS:
+            verbindung.execute(pragma)
+        if nur_lesen:
+            verbindung.execute('PRAGMA query_only = ON')
+        return verbindung
+
+    @contextmanager
+    def lese_verbindung(self):
+        """Leiht eine Leseverbindung aus dem Pool und gibt sie danach zurück."""
+        try:
+            verbindung = self._lese_pool.get_nowait()
+        except queue.Empty:
+            verbindung = self._oeffne_verbindung(nur_lesen=True)
+        try:
+            yield verbindung
+        finally:
+            try:
+                self._lese_pool.put_nowait(verbindung)
+            except queue.Full:
+                verbindung.close()
+
+    @contextmanager
+    def transaktion(self):
+        """Exklusive Schreibtransaktion auf der gemeinsamen Schreibverbindung (Aufrufer hält die Sperre)."""
+        if self._schreib_verbindung is None:
+            self._schreib_verbindung = self._oeffne_verbindung()
+        cursor = self._schreib_verbindung.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        else:
+            cursor.execute('COMMIT')
+        finally:
+            cursor.close()
+
+    def schliesse(self):
+        while not self._lese_pool.empty():
+            self._lese_pool.get_nowait().close()
+        if self._schreib_verbindung is not None:
+            self._schreib_verbindung.close()
+            self._schreib_verbindung = None
+
+
+class SqlAlchemySpeicher:
+    """Server-Datenbank über den Verbindungspool von SQLAlchemy (mehrere App-Instanzen möglich)."""
+
+    # Andere Instanzen schreiben mit; der Abfrage-Cache prüft zusätzlich das Änderungsprotokoll
+    geteilt = True
+
+    def __init__(self, url):
+        from sqlalchemy import create_engine
+
+        # pool_pre_ping: nach Neustarts des Datenbankservers keine toten Verbindungen ausgeben
+        self.engine = create_engine(url, pool_size=POOL_GROESSE, max_overflow=POOL_GROESSE, pool_pre_ping=True)
+        self.dialekt = self.engine.dialect.name
+        self.paramstyle = self.engine.dialect.paramstyle
+        self.fehler = self.engine.dialect.loaded_dbapi.Error
+
+    @contextmanager
+    def lese_verbindung(self):
+        """Leiht eine DBAPI-Verbindung aus dem Pool; close() setzt sie zurück und gibt sie zurück."""
+        verbindung = self.engine.raw_connection()
+        try:
+            yield verbindung
+        finally:
+            verbindung.close()
+
+    @contextmanager
+    def transaktion(self):
+        """Schreibtransaktion; unter PostgreSQL zusätzlich über alle Instanzen serialisiert."""
+        verbindung = self.engine.raw_connection()
+        cursor = verbindung.cursor()
+        try:
+            if self.dialekt == 'postgresql':
+                # Wie BEGIN IMMEDIATE unter SQLite: höchstens ein Schreiber zur Zeit,
+                # davon hängt u. a. die inkrementelle Ergebnis-Zusammenfassung ab
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', (SCHREIB_SPERRE_SCHLUESSEL,))
+            yield cursor
+        except BaseException:
+            verbindung.rollback()
+            raise
+        else:
+            verbindung.commit()
+        finally:
+            cursor.close()
+            verbindung.close()
+
+    def schliesse(self):
+        self.engine.dispose()
+
+
+class _UebersetzenderCursor:
+    """Reicht einen DBAPI-Cursor durch und übersetzt SQL in den Dialekt des Backends."""
+
+    def __init__(self, cursor, speicher):
+        self._cursor = cursor
+        self._speicher = speicher
+
+    def execute(self, sql, parameter=()):
+        return self._cursor.execute(passe_sql_an(sql, self._speicher.dialekt, self._speicher.paramstyle), tuple(parameter))
+
+    def executemany(self, sql, zeilen):
+        return self._cursor.executemany(
+            passe_sql_an(sql, self._speicher.dialekt, self._speicher.paramstyle), [tuple(zeile) for zeile in zeilen]
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+# Hilfsfunktionen
+@lru_cache(maxsize=1024)
+def passe_sql_an(sql, dialekt, paramstyle):
+    """Übersetzt das im Code verwendete SQLite-SQL (?-Platzhalter) für andere Backends."""
+    if dialekt == 'postgresql':
+        sql = sql.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY')
+        sql = sql.replace('json_object(', 'json_build_object(')
+    if paramstyle in ('format', 'pyformat'):
+        # Die Abfragen enthalten keine ?-Zeichen in Textliteralen; % muss maskiert werden
+        sql = sql.replace('%', '%%').replace('?', '%s')
+    elif paramstyle != 'qmark':
+        raise ValueError(f"Nicht unterstützter Parameterstil: {paramstyle}")
+    return sql
+
+def speicher():
+    """Gibt das konfigurierte Speicher-Backend zurück (beim ersten Zugriff angelegt)."""
+    global _speicher
+    with _speicher_sperre:
+        if _speicher is None:
+            _speicher = SqlAlchemySpeicher(DATENBANK_URL) if DATENBANK_URL else SqliteSpeicher(datenbank_pfad)
+        return _speicher
+
+def konfiguriere(url=None, pfad=None):
+    """Wechselt das Backend (z. B. für Benchmarks); Worker-Prozesse erben es über die Umgebung."""
+    global _speicher, DATENBANK_URL, datenbank_pfad
+    with _schreib_sperre, _speicher_sperre:
+        if _speicher is not None:
+            _speicher.schliesse()
+            _speicher = None
+        DATENBANK_URL = os.environ['MATHE_DATENBANK_URL'] = url or ''
+        if pfad is not None:
+            datenbank_pfad = os.environ['MATHE_DATENBANK'] = pfad
+    with _cache_sperre:
+        _abfrage_cache.clear()
+
+@contextmanager
+def lese_cursor():
+    """Cursor auf einer geliehenen Leseverbindung."""
+    aktueller_speicher = speicher()
+    with aktueller_speicher.lese_verbindung() as verbindung:
+        cursor = verbindung.cursor()
+        try:
+            yield _UebersetzenderCursor(cursor, aktueller_speicher)
+        except aktueller_speicher.fehler as e:
+            raise DatenbankFehler(str(e)) from e
+        finally:
+            cursor.close()
+
+def _kurz(sql):
+    """Erste Zeichen einer Anweisung als Detail für Metriken."""
+    return ' '.join(sql.split())[:80]
+
+def _als_dataframe(cursor, zeilen):
+    return pd.DataFrame.from_records(zeilen, columns=[spalte[0] for spalte in cursor.description], coerce_float=True)
+
+def erhoehe_tabellenversion(*tabellen):
+    """Markiert gecachte Abfragen auf diese Tabellen als veraltet."""
+    with _cache_sperre:
+        for tabelle in tabellen:
+            _tabellen_versionen[tabelle] += 1
+
+@contextmanager
+def schreib_transaktion(aendert=()):
+    """Führt Schreibzugriffe in einer kurzen, exklusiven Transaktion aus.
+
+    `aendert` nennt die geschriebenen Tabellen; deren Cache-Einträge werden
+    nach dem COMMIT ungültig (vorher könnten Leser noch alte Daten neu cachen).
+    """
+    aktueller_speicher = speicher()
+    with span('db_schreiben', ', '.join(aendert)), _schreib_sperre:
+        try:
+            with aktueller_speicher.transaktion() as cursor:
+                yield _UebersetzenderCursor(cursor, aktueller_speicher)
+        except aktueller_speicher.fehler as e:
+            raise DatenbankFehler(str(e)) from e
+    erhoehe_tabellenversion(*aendert)
+
+def lese_abfrage(sql, parameter=()):
+    """Führt eine lesende Abfrage aus und gibt das Ergebnis als DataFrame zurück."""
+    with span('db_abfrage', _kurz(sql)), lese_cursor() as cursor:
+        cursor.execute(sql, parameter)
+        return _als_dataframe(cursor, cursor.fetchall())
+
+def _protokoll_stand():
+    """Höchste seq des Änderungsprotokolls; ändert sich mit jedem Schreibzugriff jeder Instanz."""
+    with lese_cursor() as cursor:
+        cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM aenderungsprotokoll')
+        return cursor.fetchone()[0]
+
+def lese_abfrage_gecacht(sql, parameter=(), tabellen=()):
+    """Wie lese_abfrage, aber mit Cache; gültig bis zum nächsten Schreiben auf `tabellen` oder CACHE_TTL.
+
+    Bei einer Server-Datenbank macht jeder Schreibzugriff einer anderen Instanz
+    (erkannt am Änderungsprotokoll) alle Einträge ungültig.
+    """
+    schluessel = (sql, tuple(parameter))
+    stand = _protokoll_stand() if speicher().geteilt else 0
+    with _cache_sperre:
+        # Versionen vor der Abfrage lesen: ein paralleler Schreibzugriff macht den Eintrag sofort ungültig
+        versionen = (stand,) + tuple(_tabellen_versionen[tabelle] for tabelle in tabellen)
+        eintrag = _abfrage_cache.get(schluessel)
+        if eintrag is not None and eintrag[1] == versionen and time.monotonic() - eintrag[0] < CACHE_TTL:
+            _abfrage_cache.move_to_end(schluessel)
+            with span('db_cache_treffer', _kurz(sql)):
+                return eintrag[2].copy()
+
+    ergebnis = lese_abfrage(sql, parameter)
+    with _cache_sperre:
+        _abfrage_cache[schluessel] = (time.monotonic(), versionen, ergebnis)
+        _abfrage_cache.move_to_end(schluessel)
+        while len(_abfrage_cache) > CACHE_MAX_EINTRAEGE:
+            _abfrage_cache.popitem(last=False)
+    # Kopie zurückgeben: Aufrufer dürfen das Ergebnis verändern
+    return ergebnis.copy()
+
+def lese_bloecke(sql, parameter=(), blockgroesse=10000):
+    """Liest eine Abfrage blockweise als DataFrames, ohne das Gesamtergebnis im Speicher zu halten."""
+    with lese_cursor() as cursor:
+        cursor.execute(sql, parameter)
+        zeilen = cursor.fetchmany(blockgroesse)
+        # Auch ein leeres Ergebnis liefert einen Block, damit die Spaltennamen bekannt sind
+        yield _als_dataframe(cursor, zeilen)
+        while zeilen := cursor.fetchmany(blockgroesse):
+            yield _als_dataframe(cursor, zeilen)
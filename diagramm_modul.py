@@ -0,0 +1,84 @@
+import streamlit as st
+import hashlib
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from prognose_modul import KATEGORIEN, PROGNOSE_SPALTEN
+from metrik_modul import gemessen
+
+# Linienfarben der Kategorien (Reihenfolge wie KATEGORIEN)
+FARBEN = ['red', 'blue', 'green', 'orange', 'purple', 'brown']
+
+# zlib-Stufe der PNGs: 3 ist etwa doppelt so schnell wie die Voreinstellung 6 und kaum größer
+PNG_KOMPRESSION = 3
+
+
+# Versionierung
+def prognose_version(vorhersagen):
+    """Inhaltsschlüssel einer Prognose: ändert sich genau dann, wenn sich die Werte ändern."""
+    werte = pd.util.hash_pandas_object(vorhersagen[['Tage'] + PROGNOSE_SPALTEN], index=False)
+    return hashlib.sha1(werte.to_numpy().tobytes()).hexdigest()[:16]
+
+
+# PNG-Diagramm
+@gemessen('diagramm_png')
+def rendere_prognose_png(vorhersagen, breite=10, hoehe=6, dpi=100):
+    """Zeichnet die Prognose mit dem Agg-Backend als PNG (RGB, ohne Alphakanal).
+
+    Eigene Figure statt pyplot: kein globaler Zustand, die Figur wird nach
+    dem Speichern freigegeben. Ohne Alphakanal bettet fpdf das Bild ein,
+    ohne jedes Pixel in Python zu zerlegen.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PIL import Image
+
+    figur = Figure(figsize=(breite, hoehe), dpi=dpi)
+    leinwand = FigureCanvasAgg(figur)
+    achse = figur.add_subplot()
+    achse.plot(vorhersagen['Tage'], vorhersagen['gesamt_prozent'], label="Gesamtfortschritt", color='black')
+    for (praefix, anzeigename), farbe in zip(KATEGORIEN, FARBEN):
+        achse.plot(vorhersagen['Tage'], vorhersagen[f"{praefix}_prozent"], label=anzeigename, linestyle='dashed', color=farbe)
+
+    achse.axvline(0, color='gray', linestyle='--', label='Heute')
+    achse.set_title("60-Tage-Prognose")
+    achse.set_xlabel("Tage (von -30 bis +30)")
+    achse.set_ylabel("Prozentwert")
+    achse.legend()
+    achse.grid(True)
+    leinwand.draw()
+    bild = Image.fromarray(np.asarray(leinwand.buffer_rgba())[..., :3])
+    figur.clear()
+    with BytesIO() as puffer:
+        bild.save(puffer, format='PNG', compress_level=PNG_KOMPRESSION)
+        return puffer.getvalue()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def prognose_png(teilnehmer_id, version, _vorhersagen, breite=10, hoehe=6, dpi=100):
+    """PNG-Diagramm, gecacht je Teilnehmer und Prognoseversion (siehe prognose_version)."""
+    return rendere_prognose_png(_vorhersagen, breite, hoehe, dpi)
+
+
+# Interaktives Diagramm
+def zeichne_interaktiv(vorhersagen):
+    """Zeichnet die Prognose als Vega-Lite-Diagramm; an den Browser gehen nur die 61 x 7 Werte."""
+    import altair as alt
+
+    namen = {'gesamt_prozent': "Gesamtfortschritt", **{f"{praefix}_prozent": name for praefix, name in KATEGORIEN}}
+    daten = vorhersagen[['Tage'] + PROGNOSE_SPALTEN].rename(columns=namen).melt(
+        'Tage', var_name='Kategorie', value_name='Prozentwert'
+    )
+    linien = alt.Chart(daten).mark_line().encode(
+        x=alt.X('Tage:Q', title="Tage (von -30 bis +30)"),
+        y=alt.Y('Prozentwert:Q', scale=alt.Scale(domain=[0, 100])),
+        color=alt.Color('Kategorie:N', scale=alt.Scale(
+            domain=list(namen.values()), range=['black'] + FARBEN[:len(KATEGORIEN)]
+        )),
+        tooltip=['Kategorie', 'Tage', alt.Tooltip('Prozentwert:Q', format='.1f')],
+    )
+    heute = alt.Chart(pd.DataFrame({'Tage': [0]})).mark_rule(color='gray', strokeDash=[4, 4]).encode(x='Tage:Q')
+    st.altair_chart((linien + heute).properties(title="60-Tage-Prognose").interactive())
+
+def zeichne_bild(vorhersagen, teilnehmer_id=None):
+    """Zeigt die Prognose als PNG; gezeichnet wird nur bei neuer Prognoseversion."""
+    st.image(prognose_png(teilnehmer_id, prognose_version(vorhersagen), vorhersagen))
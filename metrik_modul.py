@@ -0,0 +1,202 @@
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Anzahl der Reruns, die für das Admin-Panel aufbewahrt werden
+LETZTE_RERUNS = int(os.environ.get('MATHE_METRIK_RERUNS', '50'))
+# Token für das Admin-Panel (Aufruf mit ?admin=<token>); leer = Panel deaktiviert
+ADMIN_TOKEN = os.environ.get('MATHE_ADMIN_TOKEN', '')
+# Prometheus-Export: Textdatei (z. B. für den Textfile-Collector) und/oder HTTP-Port für /metrics
+PROMETHEUS_DATEI = os.environ.get('MATHE_METRIK_DATEI', '')
+PROMETHEUS_PORT = int(os.environ.get('MATHE_METRIK_PORT', '0'))
+# Mindestabstand zwischen zwei Schreibvorgängen der Textdatei in Sekunden
+EXPORT_INTERVALL = 5
+
+# Histogrammgrenzen in Sekunden
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Höchstens so viele Spans werden je Rerun einzeln festgehalten (Summen zählen alle)
+MAX_SPANS_PRO_RERUN = 500
+
+_sperre = threading.Lock()
+# (Operation, Seite) -> [Anzahl je Bucket..., Anzahl, Summe]
+_histogramme = defaultdict(lambda: [0] * len(BUCKETS) + [0, 0.0])
+_reruns = deque(maxlen=LETZTE_RERUNS)
+# Jede Streamlit-Sitzung führt ihr Skript in einem eigenen Thread aus
+_aktuell = threading.local()
+_letzter_export = 0.0
+_server = None
+# Nach einem Fehler bleibt der jeweilige Export für diesen Prozess abgeschaltet
+_datei_export_aktiv = bool(PROMETHEUS_DATEI)
+_server_aktiv = bool(PROMETHEUS_PORT)
+
+_log = logging.getLogger(__name__)
+
+
+# Spans
+def _erfasse(operation, detail, dauer):
+    rerun = getattr(_aktuell, 'rerun', None)
+    seite = rerun['seite'] if rerun is not None else ''
+    with _sperre:
+        werte = _histogramme[(operation, seite)]
+        for i, grenze in enumerate(BUCKETS):
+            if dauer <= grenze:
+                werte[i] += 1
+        werte[-2] += 1
+        werte[-1] += dauer
+    if rerun is not None and len(rerun['spans']) < MAX_SPANS_PRO_RERUN:
+        rerun['spans'].append((operation, detail, dauer))
+
+@contextmanager
+def span(operation, detail=''):
+    """Misst die Laufzeit eines Blocks und ordnet sie dem laufenden Rerun zu."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _erfasse(operation, detail, time.perf_counter() - start)
+
+def gemessen(operation):
+    """Dekorator: misst jeden Aufruf der Funktion als Span `operation`."""
+    def dekorator(funktion):
+        @wraps(funktion)
+        def wrapper(*args, **kwargs):
+            with span(operation):
+                return funktion(*args, **kwargs)
+        return wrapper
+    return dekorator
+
+
+# Reruns
+def starte_rerun(seite):
+    """Beginnt die Aufzeichnung eines Streamlit-Reruns für die angegebene Seite."""
+    _starte_server()
+    _aktuell.rerun = {'seite': seite, 'beginn': time.time(), 'start': time.perf_counter(), 'spans': []}
+
+def beende_rerun():
+    """Schließt den laufenden Rerun ab und exportiert die Metriken bei Bedarf."""
+    rerun = getattr(_aktuell, 'rerun', None)
+    if rerun is None:
+        return
+    rerun['dauer'] = time.perf_counter() - rerun.pop('start')
+    _erfasse('rerun', '', rerun['dauer'])
+    _aktuell.rerun = None
+    with _sperre:
+        _reruns.append(rerun)
+    _exportiere_datei()
+
+def letzte_reruns():
+    """Kopie der zuletzt aufgezeichneten Reruns (älteste zuerst)."""
+    with _sperre:
+        return list(_reruns)
+
+
+# Prometheus-Export
+def prometheus_text():
+    """Alle Histogramme im Prometheus-Textformat."""
+    with _sperre:
+        histogramme = {schluessel: list(werte) for schluessel, werte in _histogramme.items()}
+    zeilen = [
+        '# HELP mathe_operation_dauer_sekunden Laufzeit instrumentierter Operationen je Seite',
+        '# TYPE mathe_operation_dauer_sekunden histogram',
+    ]
+    for (operation, seite), werte in sorted(histogramme.items()):
+        labels = f'operation="{operation}",seite="{seite}"'
+        # Die Bucket-Zähler sind bereits kumulativ (jede Messung zählt in allen Grenzen >= Dauer)
+        for grenze, anzahl in zip(BUCKETS, werte):
+            zeilen.append(f'mathe_operation_dauer_sekunden_bucket{{{labels},le="{grenze}"}} {anzahl}')
+        zeilen.append(f'mathe_operation_dauer_sekunden_bucket{{{labels},le="+Inf"}} {werte[-2]}')
+        zeilen.append(f'mathe_operation_dauer_sekunden_sum{{{labels}}} {werte[-1]:.6f}')
+        zeilen.append(f'mathe_operation_dauer_sekunden_count{{{labels}}} {werte[-2]}')
+    return '\n'.join(zeilen) + '\n'
+
+def _exportiere_datei():
+    global _letzter_export, _datei_export_aktiv
+    if not _datei_export_aktiv or time.monotonic() - _letzter_export < EXPORT_INTERVALL:
+        return
+    _letzter_export = time.monotonic()
+    # Atomar ersetzen, damit der Collector nie eine halbe Datei liest
+    temp_datei = f"{PROMETHEUS_DATEI}.{os.getpid()}.tmp"
+    try:
+        with open(temp_datei, 'w', encoding='utf-8') as datei:
+            datei.write(prometheus_text())
+        os.replace(temp_datei, PROMETHEUS_DATEI)
+    except OSError:
+        # Der Export ist optional und darf die Seite nicht abbrechen
+        _datei_export_aktiv = False
+        _log.exception("Metrikdatei %s kann nicht geschrieben werden; Dateiexport abgeschaltet", PROMETHEUS_DATEI)
+
+class _MetrikHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        inhalt = prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(inhalt)))
+        self.end_headers()
+        self.wfile.write(inhalt)
+
+    def log_message(self, *args):
+        pass
+
+def _starte_server():
+    """Startet den /metrics-Endpunkt einmal pro Prozess, falls ein Port konfiguriert ist."""
+    global _server, _server_aktiv
+    if not _server_aktiv or _server is not None:
+        return
+    with _sperre:
+        if _server is None and _server_aktiv:
+            try:
+                _server = ThreadingHTTPServer(('', PROMETHEUS_PORT), _MetrikHandler)
+            except OSError:
+                # Z. B. Port belegt durch eine zweite Instanz auf demselben Host
+                _server_aktiv = False
+                _log.exception("Metrik-Port %s nicht verfügbar; /metrics-Endpunkt abgeschaltet", PROMETHEUS_PORT)
+                return
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+# Admin-Panel
+def ist_admin():
+    """Prüft das Admin-Token aus dem Query-Parameter ?admin=..."""
+    import streamlit as st
+    # Als Bytes vergleichen: compare_digest lehnt Zeichenketten mit Nicht-ASCII-Zeichen ab
+    token = st.query_params.get('admin', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def zeige_admin_panel(anzahl=20):
+    """Zeigt in der Sidebar die langsamsten Operationen der letzten Reruns (nur für Admins)."""
+    if not ist_admin():
+        return
+    import streamlit as st
+    import pandas as pd
+
+    reruns = letzte_reruns()
+    with st.sidebar.expander(f"Laufzeiten (letzte {len(reruns)} Reruns)"):
+        spans = pd.DataFrame(
+            [(rerun['seite'], operation, detail, dauer * 1000)
+             for rerun in reruns for operation, detail, dauer in rerun['spans']],
+            columns=['Seite', 'Operation', 'Detail', 'Dauer (ms)'],
+        )
+        st.caption("Langsamste Operationen")
+        st.dataframe(spans.nlargest(anzahl, 'Dauer (ms)').round(1), hide_index=True)
+
+        st.caption("Je Operation")
+        je_operation = spans.groupby('Operation')['Dauer (ms)'].agg(['count', 'sum', 'max']).round(1)
+        je_operation.columns = ['Anzahl', 'Summe (ms)', 'Max (ms)']
+        st.dataframe(je_operation.sort_values('Summe (ms)', ascending=False))
+
+        st.caption("Reruns je Seite")
+        je_seite = pd.DataFrame([(rerun['seite'], rerun['dauer'] * 1000) for rerun in reruns],
+                                columns=['Seite', 'Dauer (ms)'])
+        je_seite = je_seite.groupby('Seite')['Dauer (ms)'].agg(['count', 'median', 'max']).round(1)
+        je_seite.columns = ['Anzahl', 'Median (ms)', 'Max (ms)']
+        st.dataframe(je_seite)
+        st.download_button("Prometheus-Metriken", prometheus_text(), file_name="metriken.prom")
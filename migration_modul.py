@@ -0,0 +1,234 @@
+from datetime import datetime
+from datenbank_modul import schreib_transaktion, speicher
+
+
+def _protokolliere_bestand(cursor):
+    """Übernimmt alle vorhandenen Zeilen als Einfügungen ins Änderungsprotokoll (Ausgangsstand für Abnehmer).
+
+    Spalten und SQL sind eine feste Kopie des Stands von Migration 5.
+    """
+    zeitpunkt = datetime.now().isoformat(timespec='seconds')
+    cursor.execute('''
+    INSERT INTO aenderungsprotokoll (zeitpunkt, tabelle, datensatz_id, aktion, daten)
+    SELECT ?, 'teilnehmer', id, 'insert', json_object(
+        'name', name, 'sv_nummer', sv_nummer, 'berufswunsch', berufswunsch,
+        'eintrittsdatum', eintrittsdatum, 'austrittsdatum', austrittsdatum
+    )
+    FROM teilnehmer ORDER BY id
+    ''', (zeitpunkt,))
+    cursor.execute('''
+    INSERT INTO aenderungsprotokoll (zeitpunkt, tabelle, datensatz_id, aktion, daten)
+    SELECT ?, 'testergebnisse', id, 'insert', json_object(
+        'teilnehmer_id', teilnehmer_id, 'test_datum', test_datum,
+        'textaufgaben_erreicht', textaufgaben_erreicht, 'textaufgaben_max', textaufgaben_max,
+        'raumvorstellung_erreicht', raumvorstellung_erreicht, 'raumvorstellung_max', raumvorstellung_max,
+        'gleichungen_erreicht', gleichungen_erreicht, 'gleichungen_max', gleichungen_max,
+        'brueche_erreicht', brueche_erreicht, 'brueche_max', brueche_max,
+        'grundrechenarten_erreicht', grundrechenarten_erreicht, 'grundrechenarten_max', grundrechenarten_max,
+        'zahlenraum_erreicht', zahlenraum_erreicht, 'zahlenraum_max', zahlenraum_max,
+        'gesamt_prozent', gesamt_prozent
+    )
+    FROM testergebnisse ORDER BY id
+    ''', (zeitpunkt,))
+
+def _protokolliere_prozente(cursor):
+    """Protokolliert die nachgetragenen Prozentwerte von Migration 6 als Änderungen (alt: Spaltenvorgabe 0)."""
+    zeitpunkt = datetime.now().isoformat(timespec='seconds')
+    cursor.execute('''
+    INSERT INTO aenderungsprotokoll (zeitpunkt, tabelle, datensatz_id, aktion, daten)
+    SELECT ?, 'testergebnisse', id, 'update', json_object(
+        'textaufgaben_prozent', json_object('alt', 0, 'neu', textaufgaben_prozent),
+        'raumvorstellung_prozent', json_object('alt', 0, 'neu', raumvorstellung_prozent),
+        'gleichungen_prozent', json_object('alt', 0, 'neu', gleichungen_prozent),
+        'brueche_prozent', json_object('alt', 0, 'neu', brueche_prozent),
+        'grundrechenarten_prozent', json_object('alt', 0, 'neu', grundrechenarten_prozent),
+        'zahlenraum_prozent', json_object('alt', 0, 'neu', zahlenraum_prozent)
+    )
+    FROM testergebnisse ORDER BY id
+    ''', (zeitpunkt,))
+
+# Versionierte Schemaänderungen: (Version, Beschreibung, Anweisungen). Eine
+# Anweisung ist SQL-Text oder eine Funktion, die den Cursor erhält.
+# Bereits ausgelieferte Migrationen niemals ändern, sondern neue anhängen.
+MIGRATIONEN = [
+    (1, "Tabellen teilnehmer und testergebnisse anlegen", [
+        '''
+        CREATE TABLE IF NOT EXISTS teilnehmer (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            sv_nummer TEXT NOT NULL UNIQUE,
+            berufswunsch TEXT NOT NULL,
+            eintrittsdatum TEXT NOT NULL,
+            austrittsdatum TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS testergebnisse (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teilnehmer_id INTEGER NOT NULL,
+            test_datum TEXT NOT NULL,
+            textaufgaben_erreicht INTEGER NOT NULL,
+            textaufgaben_max INTEGER NOT NULL,
+            raumvorstellung_erreicht INTEGER NOT NULL,
+            raumvorstellung_max INTEGER NOT NULL,
+            gleichungen_erreicht INTEGER NOT NULL,
+            gleichungen_max INTEGER NOT NULL,
+            brueche_erreicht INTEGER NOT NULL,
+            brueche_max INTEGER NOT NULL,
+            grundrechenarten_erreicht INTEGER NOT NULL,
+            grundrechenarten_max INTEGER NOT NULL,
+            zahlenraum_erreicht INTEGER NOT NULL,
+            zahlenraum_max INTEGER NOT NULL,
+            gesamt_prozent REAL NOT NULL,
+            FOREIGN KEY (teilnehmer_id) REFERENCES teilnehmer (id)
+        )
+        ''',
+    ]),
+    (2, "Datumswerte einheitlich als ISO-8601 (YYYY-MM-DD) speichern", [
+        # ISO-Datumstexte sind lexikographisch sortierbar und damit indexierbar
+        '''
+        UPDATE testergebnisse SET test_datum = date(test_datum)
+        WHERE date(test_datum) IS NOT NULL AND test_datum <> date(test_datum)
+        ''',
+        '''
+        UPDATE teilnehmer SET eintrittsdatum = date(eintrittsdatum)
+        WHERE date(eintrittsdatum) IS NOT NULL AND eintrittsdatum <> date(eintrittsdatum)
+        ''',
+        '''
+        UPDATE teilnehmer SET austrittsdatum = date(austrittsdatum)
+        WHERE date(austrittsdatum) IS NOT NULL AND austrittsdatum <> date(austrittsdatum)
+        ''',
+    ]),
+    (3, "Indizes für Ergebnisabfragen und aktive Teilnehmer", [
+        # Deckt "WHERE teilnehmer_id = ? ORDER BY test_datum DESC LIMIT 1" ohne Sortierung ab
+        '''
+        CREATE INDEX IF NOT EXISTS idx_testergebnisse_teilnehmer_datum
+        ON testergebnisse (teilnehmer_id, test_datum)
+        ''',
+        # "austrittsdatum > heute" wird zum Bereichsscan über die aktiven Teilnehmer
+        '''
+        CREATE INDEX IF NOT EXISTS idx_teilnehmer_austrittsdatum
+        ON teilnehmer (austrittsdatum, id)
+        ''',
+    ]),
+    (4, "Zusammenfassung je Berufswunsch, Kohorte, Testmonat und Ergebnisbereich", [
+        # Feste Kopie des Schemas und der Erstbefüllung; die laufende Pflege
+        # übernimmt analyse_modul.aktualisiere_zusammenfassung
+        '''
+        CREATE TABLE IF NOT EXISTS ergebnis_zusammenfassung (
+            berufswunsch TEXT NOT NULL,
+            kohorte TEXT NOT NULL,
+            test_monat TEXT NOT NULL,
+            bereich INTEGER NOT NULL,
+            anzahl INTEGER NOT NULL,
+            summe_gesamt REAL NOT NULL,
+            summe_quadrat_gesamt REAL NOT NULL,
+            summe_textaufgaben REAL NOT NULL,
+            summe_raumvorstellung REAL NOT NULL,
+            summe_gleichungen REAL NOT NULL,
+            summe_brueche REAL NOT NULL,
+            summe_grundrechenarten REAL NOT NULL,
+            summe_zahlenraum REAL NOT NULL,
+            PRIMARY KEY (berufswunsch, kohorte, test_monat, bereich)
+        )
+        ''',
+        '''
+        INSERT INTO ergebnis_zusammenfassung (
+            berufswunsch, kohorte, test_monat, bereich, anzahl, summe_gesamt, summe_quadrat_gesamt,
+            summe_textaufgaben, summe_raumvorstellung, summe_gleichungen,
+            summe_brueche, summe_grundrechenarten, summe_zahlenraum
+        )
+        SELECT t.berufswunsch, substr(t.eintrittsdatum, 1, 7), substr(e.test_datum, 1, 7),
+               CASE WHEN e.gesamt_prozent < 10 THEN 0 WHEN e.gesamt_prozent < 20 THEN 1
+                    WHEN e.gesamt_prozent < 30 THEN 2 WHEN e.gesamt_prozent < 40 THEN 3
+                    WHEN e.gesamt_prozent < 50 THEN 4 WHEN e.gesamt_prozent < 60 THEN 5
+                    WHEN e.gesamt_prozent < 70 THEN 6 WHEN e.gesamt_prozent < 80 THEN 7
+                    WHEN e.gesamt_prozent < 90 THEN 8 ELSE 9 END,
+               COUNT(*), SUM(e.gesamt_prozent), SUM(e.gesamt_prozent * e.gesamt_prozent),
+               SUM(CASE WHEN e.textaufgaben_max > 0 THEN e.textaufgaben_erreicht * 100.0 / e.textaufgaben_max ELSE 0 END),
+               SUM(CASE WHEN e.raumvorstellung_max > 0 THEN e.raumvorstellung_erreicht * 100.0 / e.raumvorstellung_max ELSE 0 END),
+               SUM(CASE WHEN e.gleichungen_max > 0 THEN e.gleichungen_erreicht * 100.0 / e.gleichungen_max ELSE 0 END),
+               SUM(CASE WHEN e.brueche_max > 0 THEN e.brueche_erreicht * 100.0 / e.brueche_max ELSE 0 END),
+               SUM(CASE WHEN e.grundrechenarten_max > 0 THEN e.grundrechenarten_erreicht * 100.0 / e.grundrechenarten_max ELSE 0 END),
+               SUM(CASE WHEN e.zahlenraum_max > 0 THEN e.zahlenraum_erreicht * 100.0 / e.zahlenraum_max ELSE 0 END)
+        FROM testergebnisse e JOIN teilnehmer t ON t.id = e.teilnehmer_id
+        GROUP BY 1, 2, 3, 4
+        ''',
+    ]),
+    (5, "Änderungsprotokoll für Teilnehmer und Testergebnisse", [
+        # Nur anhängen: seq ist der Lesecursor für inkrementelle Abnehmer
+        '''
+        CREATE TABLE IF NOT EXISTS aenderungsprotokoll (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            zeitpunkt TEXT NOT NULL,
+            tabelle TEXT NOT NULL,
+            datensatz_id INTEGER NOT NULL,
+            aktion TEXT NOT NULL,
+            daten TEXT NOT NULL
+        )
+        ''',
+        _protokolliere_bestand,
+    ]),
+    (6, "Prozentwerte je Kategorie in testergebnisse speichern", [
+        # Werden beim Einfügen berechnet; Leser müssen sie nicht mehr aus den Punkten ableiten
+        'ALTER TABLE testergebnisse ADD COLUMN textaufgaben_prozent REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE testergebnisse ADD COLUMN raumvorstellung_prozent REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE testergebnisse ADD COLUMN gleichungen_prozent REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE testergebnisse ADD COLUMN brueche_prozent REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE testergebnisse ADD COLUMN grundrechenarten_prozent REAL NOT NULL DEFAULT 0',
+        'ALTER TABLE testergebnisse ADD COLUMN zahlenraum_prozent REAL NOT NULL DEFAULT 0',
+        '''
+        UPDATE testergebnisse SET
+            textaufgaben_prozent = CASE WHEN textaufgaben_max > 0 THEN textaufgaben_erreicht * 100.0 / textaufgaben_max ELSE 0 END,
+            raumvorstellung_prozent = CASE WHEN raumvorstellung_max > 0 THEN raumvorstellung_erreicht * 100.0 / raumvorstellung_max ELSE 0 END,
+            gleichungen_prozent = CASE WHEN gleichungen_max > 0 THEN gleichungen_erreicht * 100.0 / gleichungen_max ELSE 0 END,
+            brueche_prozent = CASE WHEN brueche_max > 0 THEN brueche_erreicht * 100.0 / brueche_max ELSE 0 END,
+            grundrechenarten_prozent = CASE WHEN grundrechenarten_max > 0 THEN grundrechenarten_erreicht * 100.0 / grundrechenarten_max ELSE 0 END,
+            zahlenraum_prozent = CASE WHEN zahlenraum_max > 0 THEN zahlenraum_erreicht * 100.0 / zahlenraum_max ELSE 0 END
+        ''',
+        # Abnehmer des Änderungsprotokolls erhalten die Werte auch für den Bestand
+        _protokolliere_prozente,
+    ]),
+]
+
+# Migrationen, die nur für bestimmte Dialekte gelten; auf anderen Backends
+# werden sie ohne Ausführung als angewendet vermerkt. Migration 2 betrifft nur
+# Altbestände in SQLite-Dateien (date() normalisiert dort die Texte),
+# Server-Datenbanken starten mit sauberen Daten.
+MIGRATIONS_DIALEKTE = {2: ('sqlite',)}
+
+
+def _angewendete_versionen(cursor):
+    """Liest die bereits angewendeten Migrationsversionen."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrationen (
+        version INTEGER PRIMARY KEY,
+        beschreibung TEXT NOT NULL,
+        angewendet_am TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('SELECT version FROM schema_migrationen')
+    return {zeile[0] for zeile in cursor.fetchall()}
+
+def migriere():
+    """Wendet alle ausstehenden Migrationen in aufsteigender Reihenfolge an."""
+    angewendet = []
+    for version, beschreibung, anweisungen in sorted(MIGRATIONEN):
+        # Jede Migration in eigener Transaktion; parallele Prozesse prüfen erneut unter Sperre
+        with schreib_transaktion() as cursor:
+            if version in _angewendete_versionen(cursor):
+                continue
+            if speicher().dialekt not in MIGRATIONS_DIALEKTE.get(version, (speicher().dialekt,)):
+                # Für dieses Backend gegenstandslos: nur als angewendet vermerken
+                anweisungen = []
+            for anweisung in anweisungen:
+                if callable(anweisung):
+                    anweisung(cursor)
+                else:
+                    cursor.execute(anweisung)
+            cursor.execute(
+                'INSERT INTO schema_migrationen (version, beschreibung, angewendet_am) VALUES (?, ?, ?)',
+                (version, beschreibung, datetime.now().isoformat(timespec='seconds'))
+            )
+            angewendet.append(version)
+    return angewendet
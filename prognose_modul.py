@@ -1,131 +1,316 @@
 import streamlit as st
-import sqlite3
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from pycaret.regression import setup, compare_models, predict_model, save_model, load_model
-import matplotlib.pyplot as plt
+from datetime import date
 import os
+from datenbank_modul import lese_abfrage_gecacht
+from metrik_modul import gemessen, span
+from teilnehmer_modul import zaehle_teilnehmer, waehle_teilnehmer
+from training_modul import (
+    MODELL_NAME, MODELL_DATEI, MERKMALE, VERGLEICHSMETRIK, starte_training, training_laeuft, trainingsstatus,
+    aktiviere_version, aktive_version, modellversionen, nachtraining_faellig, version_fixiert, hebe_fixierung_auf,
+)
 
-# Absoluter Pfad zur Datenbank im temporären Verzeichnis
-datenbank_pfad = os.path.join('/tmp', 'mathematik_kurs.db')
+# Prognose-Backend: "numpy" (Trendschätzung, Standard) oder "pycaret" (AutoML-Modell)
+PROGNOSE_BACKEND = os.environ.get('MATHE_PROGNOSE_BACKEND', 'numpy').lower()
 
-# Verbindung zur Datenbank
-verbindung = sqlite3.connect(datenbank_pfad, check_same_thread=False)
+# Kategorien: (Spaltenpräfix, Anzeigename)
+KATEGORIEN = [
+    ('textaufgaben', 'Textaufgaben'), ('raumvorstellung', 'Raumvorstellung'),
+    ('gleichungen', 'Gleichungen'), ('brueche', 'Brüche'),
+    ('grundrechenarten', 'Grundrechenarten'), ('zahlenraum', 'Zahlenraum')
+]
+PROZENT_SPALTEN = [f"{praefix}_prozent" for praefix, _ in KATEGORIEN]
+PROGNOSE_SPALTEN = PROZENT_SPALTEN + ['gesamt_prozent']
+
+# Voreinstellung des Prognosediagramms: "bild" (gecachtes PNG) oder "interaktiv" (Vega-Lite)
+DIAGRAMM_MODUS = os.environ.get('MATHE_DIAGRAMM', 'bild').lower()
+
+# Prognosezeitraum relativ zu heute
+PROGNOSE_TAGE = np.arange(-30, 31)
 
 # Modell speichern/laden
-def lade_modell():
-    """Lädt das gespeicherte Modell oder erstellt ein neues Modell, wenn keines vorhanden ist."""
+def modell_version():
+    """Gibt die Version der Modelldatei (Änderungszeitpunkt) zurück oder None."""
     try:
-        modell = load_model('bestes_prognose_modell')
-        return modell
+        return os.stat(MODELL_DATEI).st_mtime_ns
     except FileNotFoundError:
-        st.warning("Kein gespeichertes Modell gefunden. Trainiere neues Modell...")
-        return trainiere_modell()
-
-def trainiere_modell():
-    """Trainiert ein neues Modell basierend auf vorhandenen Testergebnissen."""
-    testergebnisse_df = pd.read_sql_query('SELECT * FROM testergebnisse', verbindung)
-    if testergebnisse_df.empty:
-        st.error("Nicht genügend Daten zum Trainieren des Modells.")
         return None
 
-    # Nur relevante Spalten für das Modell verwenden
-    daten = testergebnisse_df[[
-        'textaufgaben_erreicht', 'raumvorstellung_erreicht', 'gleichungen_erreicht',
-        'brueche_erreicht', 'grundrechenarten_erreicht', 'zahlenraum_erreicht', 'gesamt_prozent'
-    ]]
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _lade_modell_version(modell_name, version):
+    """Deserialisiert das Modell einmal pro Prozess und Dateiversion."""
+    with span('modell_laden', modell_name):
+        from pycaret.regression import load_model
+        return load_model(modell_name, verbose=False)
 
-    # Sicherstellen, dass keine fehlenden Werte vorhanden sind
-    daten = daten.dropna()
+def leere_modell_cache():
+    """Verwirft gecachte Modelle und Prognosen, z. B. nach neuem Training."""
+    _lade_modell_version.clear()
+    _prognose_gecacht.clear()
 
-    # Sicherstellen, dass es genügend Datenpunkte gibt
-    if daten.shape[0] < 2:
-        st.error("Nicht genügend Datenpunkte zum Trainieren des Modells.")
+def lade_modell():
+    """Lädt das gespeicherte Modell oder startet das Training, wenn keines vorhanden ist."""
+    version = modell_version()
+    if version is None:
+        # Nach einem Fehlschlag nicht bei jedem Rerun erneut starten (Button "Modell neu trainieren")
+        if not training_laeuft() and trainingsstatus()['zustand'] != 'fehlgeschlagen':
+            st.warning("Kein gespeichertes Modell gefunden. Trainiere neues Modell...")
+            trainiere_modell()
         return None
+    return _lade_modell_version(MODELL_NAME, version)
 
-    # PyCaret-Setup und Modellvergleich
-    try:
-        setup(data=daten, target='gesamt_prozent', silent=True, session_id=123)
-        bestes_modell = compare_models()
-        save_model(bestes_modell, 'bestes_prognose_modell')
-        st.success("Modelltraining abgeschlossen und Modell gespeichert.")
-        return bestes_modell
-    except Exception as e:
-        st.error(f"Fehler beim Modelltraining: {e}")
+def trainiere_modell():
+    """Startet das Modelltraining im Hintergrund; bis zum Abschluss bleibt das alte Modell aktiv."""
+    job = starte_training()
+    job.add_done_callback(lambda _: leere_modell_cache())
+    return job
+
+def pruefe_nachtraining():
+    """Startet ein Nachtraining, wenn genügend neue Testergebnisse vorliegen (nur PyCaret-Backend)."""
+    if PROGNOSE_BACKEND != 'pycaret' or modell_version() is None or not nachtraining_faellig():
         return None
+    return trainiere_modell()
+
+def zeige_modellversionen():
+    """Listet die Modellversionen mit Kennzahlen auf und erlaubt das Zurücksetzen auf eine ältere."""
+    versionen = modellversionen()
+    if not versionen:
+        return
+    aktiv = aktive_version()
+    with st.expander(f"Modellversionen (aktiv: {aktiv['version'] if aktiv else '-'})"):
+        tabelle = pd.DataFrame([{
+            'Version': v['version'], 'Zeitpunkt': v['zeitpunkt'], 'Modell': v['modell_id'], 'Modus': v['modus'],
+            'Trainingszeilen': v['trainingszeilen'], **v['metriken'],
+            'Aktiv': bool(aktiv) and v['version'] == aktiv['version'],
+        } for v in reversed(versionen)])
+        st.dataframe(tabelle, hide_index=True)
+        if aktiv and version_fixiert():
+            st.info(f"Version {aktiv['version']} ist fixiert; automatisches Nachtraining ist ausgesetzt.")
+            if st.button("Fixierung aufheben"):
+                hebe_fixierung_auf()
+                st.rerun()
+        version = st.selectbox("Version", tabelle['Version'])
+        # Von Hand gewählte Versionen fixieren, sonst ersetzt das nächste Nachtraining sie sofort wieder
+        if st.button("Version aktivieren", disabled=training_laeuft()):
+            aktiviere_version(version, fixiert=True)
+            leere_modell_cache()
+            st.rerun()
 
+@st.fragment(run_every=2)
+def zeige_trainingsstatus():
+    """Zeigt den Fortschritt des Hintergrundtrainings an und lädt die Seite nach Abschluss neu."""
+    status = trainingsstatus()
+    if status['zustand'] == 'läuft':
+        st.info(f"Modelltraining läuft ({status['phase'] or 'Start'}, {status['dauer']:.0f} s)...")
+        st.session_state['training_beobachtet'] = True
+    elif st.session_state.pop('training_beobachtet', False):
+        # Training gerade beendet: ganze Seite mit dem neuen Modell neu aufbauen
+        st.rerun()
+    elif status['zustand'] == 'fehlgeschlagen':
+        st.error(f"Fehler beim Modelltraining: {status['fehler']}")
+    elif status['zustand'] == 'fertig':
+        art = "Vergleich aller Modelle" if status['modus'] == 'vergleich' else "Nachtraining des besten Modells"
+        if status['aktiviert']:
+            st.success(f"Modelltraining abgeschlossen: Version {status['version']}, {art} "
+                       f"({status['zeilen']} Datensätze, {status['dauer']:.0f} s).")
+        else:
+            st.warning(f"Modelltraining abgeschlossen: Version {status['version']} ({art}) wurde nicht aktiviert, "
+                       f"da ihr {VERGLEICHSMETRIK} schlechter ist als der der aktiven Version.")
+
+@gemessen('modell_vorhersage')
 def generiere_prognosen(modell, daten):
     """Erstellt Vorhersagen für einen gegebenen Datensatz."""
-    vorhersagen = predict_model(modell, data=daten)
+    from pycaret.regression import predict_model
+    vorhersagen = predict_model(modell, data=daten[MERKMALE], verbose=False)
+    # PyCaret 3 liefert die Vorhersage als "prediction_label"
+    return vorhersagen.rename(columns={'prediction_label': 'gesamt_prozent'})
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _prognose_gecacht(_modell, version, prognosedaten):
+    """Memoisiert Vorhersagen pro Modellversion und Eingabedaten (letztes Testergebnis)."""
+    return generiere_prognosen(_modell, prognosedaten)
+
+# NumPy-Trendprognose
+def trend_koeffizienten(ergebnisse, stichtag=None):
+    """Schätzt je Teilnehmer und Kategorie eine lineare Regression über die Testdaten.
+
+    Gibt (teilnehmer_ids, achsenabschnitte, steigungen) zurück; die Achsenabschnitte
+    beziehen sich auf den Stichtag (Tag 0), die Steigung ist in Prozentpunkten pro Tag.
+    Bei nur einem Testtermin ist die Steigung 0 (Fortschreibung des letzten Stands).
+    """
+    stichtag = pd.Timestamp(stichtag or date.today())
+    x = (pd.to_datetime(ergebnisse['test_datum']) - stichtag).dt.days.to_numpy(dtype=float)
+    # Prozentwerte je Kategorie werden beim Speichern berechnet (Migration 6)
+    y = ergebnisse[PROGNOSE_SPALTEN].to_numpy(dtype=float)
+    gruppen, teilnehmer_ids = pd.factorize(ergebnisse['teilnehmer_id'], sort=True)
+    anzahl_gruppen = len(teilnehmer_ids)
+
+    # Summen je Teilnehmer über bincount statt einer Python-Schleife pro Teilnehmer
+    n = np.bincount(gruppen, minlength=anzahl_gruppen).astype(float)
+    sx = np.bincount(gruppen, weights=x, minlength=anzahl_gruppen)
+    sxx = np.bincount(gruppen, weights=x * x, minlength=anzahl_gruppen)
+    sy = np.column_stack([np.bincount(gruppen, weights=y[:, k], minlength=anzahl_gruppen) for k in range(y.shape[1])])
+    sxy = np.column_stack([np.bincount(gruppen, weights=x * y[:, k], minlength=anzahl_gruppen) for k in range(y.shape[1])])
+
+    nenner = (n * sxx - sx * sx)[:, None]
+    steigungen = np.divide(n[:, None] * sxy - sx[:, None] * sy, nenner,
+                           out=np.zeros_like(sy), where=np.abs(nenner) > 1e-9)
+    achsenabschnitte = (sy - steigungen * sx[:, None]) / n[:, None]
+    return np.asarray(teilnehmer_ids), achsenabschnitte, steigungen
+
+def trend_prognose(ergebnisse, stichtag=None, tage=PROGNOSE_TAGE):
+    """Erstellt Tagesprognosen für alle Teilnehmer in `ergebnisse` in einem Durchlauf."""
+    teilnehmer_ids, achsenabschnitte, steigungen = trend_koeffizienten(ergebnisse, stichtag)
+    tage = np.asarray(tage)
+    # (Teilnehmer, Tage, Kategorien) per Broadcasting, auf 0-100 % begrenzt
+    werte = np.clip(achsenabschnitte[:, None, :] + steigungen[:, None, :] * tage[None, :, None], 0, 100)
+    vorhersagen = pd.DataFrame(werte.reshape(-1, len(PROGNOSE_SPALTEN)), columns=PROGNOSE_SPALTEN)
+    vorhersagen.insert(0, 'Tage', np.tile(tage, len(teilnehmer_ids)))
+    vorhersagen.insert(0, 'teilnehmer_id', np.repeat(teilnehmer_ids, len(tage)))
+    return vorhersagen
+
+# Prognosen
+@gemessen('prognose')
+def erstelle_prognose(teilnehmer_id, modell=None):
+    """Erstellt die 60-Tage-Prognose eines Teilnehmers mit dem konfigurierten Backend."""
+    if PROGNOSE_BACKEND == 'pycaret':
+        prognosedaten = erstelle_prognosedaten(teilnehmer_id)
+        if prognosedaten is None:
+            return None
+        vorhersagen = _prognose_gecacht(modell, modell_version(), prognosedaten)
+        vorhersagen['Tage'] = prognosedaten['Tage']
+        vorhersagen[PROZENT_SPALTEN] = prognosedaten[PROZENT_SPALTEN]
+        return vorhersagen
+
+    historie = lese_abfrage_gecacht('SELECT * FROM testergebnisse WHERE teilnehmer_id = ?', (teilnehmer_id,), ('testergebnisse',))
+    if historie.empty:
+        st.error("Keine Testdaten für diesen Teilnehmer vorhanden.")
+        return None
+    return trend_prognose(historie).drop(columns='teilnehmer_id')
+
+@gemessen('prognose_batch')
+def erstelle_prognosen_batch(modell=None, stichtag=None, nur_aktive=True):
+    """Erstellt Prognosen für alle (aktiven) Teilnehmer in einem Durchlauf.
+
+    Gibt einen Tidy-DataFrame mit einer Zeile je Teilnehmer und Tag zurück
+    (teilnehmer_id, name, Tage, Kategorie-Prozente, gesamt_prozent).
+    """
+    # Leere Grenze: "austrittsdatum > ''" trifft auf alle Teilnehmer zu
+    heute = (stichtag or date.today()).isoformat() if nur_aktive else ''
+    if PROGNOSE_BACKEND == 'pycaret':
+        # Letztes Testergebnis je aktivem Teilnehmer in einer Abfrage
+        letzte = lese_abfrage_gecacht('''
+        SELECT * FROM (
+            SELECT t.name, e.*,
+                   ROW_NUMBER() OVER (PARTITION BY e.teilnehmer_id ORDER BY e.test_datum DESC, e.id DESC) AS rang
+            FROM testergebnisse e JOIN teilnehmer t ON t.id = e.teilnehmer_id
+            WHERE t.austrittsdatum > ?
+        ) AS letzte_ergebnisse WHERE rang = 1
+        ORDER BY teilnehmer_id
+        ''', (heute,), ('teilnehmer', 'testergebnisse'))
+        if letzte.empty:
+            return pd.DataFrame(columns=['teilnehmer_id', 'name', 'Tage'] + PROGNOSE_SPALTEN)
+        # Eine Vorhersage je Teilnehmer (das Modell kennt keine Zeitachse), dann auf alle Tage verteilen
+        werte = letzte[PROZENT_SPALTEN].astype(float)
+        werte['gesamt_prozent'] = generiere_prognosen(modell, letzte)['gesamt_prozent'].to_numpy()
+        vorhersagen = pd.DataFrame(
+            np.repeat(werte[PROGNOSE_SPALTEN].to_numpy(), len(PROGNOSE_TAGE), axis=0), columns=PROGNOSE_SPALTEN
+        )
+        vorhersagen.insert(0, 'Tage', np.tile(PROGNOSE_TAGE, len(letzte)))
+        vorhersagen.insert(0, 'teilnehmer_id', np.repeat(letzte['teilnehmer_id'].to_numpy(), len(PROGNOSE_TAGE)))
+        namen = letzte[['teilnehmer_id', 'name']]
+    else:
+        # Vollständige Historie aller aktiven Teilnehmer in einer Abfrage
+        historie = lese_abfrage_gecacht('''
+        SELECT t.name, e.* FROM testergebnisse e JOIN teilnehmer t ON t.id = e.teilnehmer_id
+        WHERE t.austrittsdatum > ?
+        ''', (heute,), ('teilnehmer', 'testergebnisse'))
+        if historie.empty:
+            return pd.DataFrame(columns=['teilnehmer_id', 'name', 'Tage'] + PROGNOSE_SPALTEN)
+        vorhersagen = trend_prognose(historie, stichtag)
+        namen = historie[['teilnehmer_id', 'name']].drop_duplicates('teilnehmer_id')
+
+    vorhersagen.insert(1, 'name', vorhersagen['teilnehmer_id'].map(namen.set_index('teilnehmer_id')['name']))
     return vorhersagen
 
 def erstelle_prognosedaten(teilnehmer_id):
     """Bereitet die Daten für Prognosen vor."""
     # Letzte Testergebnisse des Teilnehmers abrufen
-    testergebnisse_df = pd.read_sql_query(f'''
-    SELECT textaufgaben_erreicht, raumvorstellung_erreicht, gleichungen_erreicht,
-           brueche_erreicht, grundrechenarten_erreicht, zahlenraum_erreicht
-    FROM testergebnisse WHERE teilnehmer_id = {teilnehmer_id}
+    testergebnisse_df = lese_abfrage_gecacht('''
+    SELECT textaufgaben_erreicht, textaufgaben_max, raumvorstellung_erreicht, raumvorstellung_max,
+           gleichungen_erreicht, gleichungen_max, brueche_erreicht, brueche_max,
+           grundrechenarten_erreicht, grundrechenarten_max, zahlenraum_erreicht, zahlenraum_max,
+           textaufgaben_prozent, raumvorstellung_prozent, gleichungen_prozent,
+           brueche_prozent, grundrechenarten_prozent, zahlenraum_prozent
+    FROM testergebnisse WHERE teilnehmer_id = ?
     ORDER BY test_datum DESC LIMIT 1
-    ''', verbindung)
+    ''', (teilnehmer_id,), ('testergebnisse',))
 
     if testergebnisse_df.empty:
         st.error("Keine Testdaten für diesen Teilnehmer vorhanden.")
         return None
 
     # Daten für 60-Tage-Prognose vorbereiten
-    daten = pd.concat([testergebnisse_df] * 61, ignore_index=True)
-    daten['Tage'] = range(-30, 31)
+    daten = pd.concat([testergebnisse_df] * len(PROGNOSE_TAGE), ignore_index=True)
+    daten['Tage'] = PROGNOSE_TAGE
     return daten
 
-def zeichne_prognosediagramm(vorhersagen):
-    """Erstellt ein Liniendiagramm der Prognosen."""
-    plt.figure(figsize=(10, 6))
-    plt.plot(vorhersagen['Tage'], vorhersagen['gesamt_prozent'], label="Gesamtfortschritt", color='black')
-
-    # Kategoriedaten zeichnen
-    kategorien = ['textaufgaben_erreicht', 'raumvorstellung_erreicht', 'gleichungen_erreicht',
-                  'brueche_erreicht', 'grundrechenarten_erreicht', 'zahlenraum_erreicht']
-    farben = ['red', 'blue', 'green', 'orange', 'purple', 'brown']
-    for kategorie, farbe in zip(kategorien, farben):
-        plt.plot(vorhersagen['Tage'], vorhersagen[kategorie], label=kategorie.capitalize(), linestyle='dashed', color=farbe)
-
-    plt.axvline(0, color='gray', linestyle='--', label='Heute')
-    plt.title("60-Tage-Prognose")
-    plt.xlabel("Tage (von -30 bis +30)")
-    plt.ylabel("Prozentwert")
-    plt.legend()
-    plt.grid(True)
-    st.pyplot(plt)
+@gemessen('diagramm')
+def zeichne_prognosediagramm(vorhersagen, teilnehmer_id=None, interaktiv=False):
+    """Zeigt die Prognose als gecachtes Bild oder als interaktives Diagramm."""
+    from diagramm_modul import zeichne_bild, zeichne_interaktiv
+    if interaktiv:
+        zeichne_interaktiv(vorhersagen)
+    else:
+        zeichne_bild(vorhersagen, teilnehmer_id)
 
 # Prognosesystem
 def prognosesystem():
     st.header("Prognose-System")
 
     # Teilnehmerdaten abrufen
-    teilnehmer_df = pd.read_sql_query('SELECT id, name FROM teilnehmer', verbindung)
-    if teilnehmer_df.empty:
+    if zaehle_teilnehmer(nur_aktive=False) == 0:
         st.warning("Keine Teilnehmer vorhanden. Bitte zuerst Teilnehmer hinzufügen.")
         return
 
     # Teilnehmer auswählen
-    teilnehmer_df['Auswahl'] = teilnehmer_df.apply(lambda x: f"{x['name']} (ID: {x['id']})", axis=1)
-    ausgewaehlter = st.selectbox("Teilnehmer auswählen", teilnehmer_df['Auswahl'])
-    teilnehmer_id = int(ausgewaehlter.split("ID: ")[1].strip(')'))
-    name = teilnehmer_df[teilnehmer_df['id'] == teilnehmer_id]['name'].values[0]
+    auswahl = waehle_teilnehmer()
+    if auswahl is None:
+        return
+    teilnehmer_id, name = auswahl
     st.subheader(f"Prognose für {name}")
 
-    # Modell laden und Prognose erstellen
-    modell = lade_modell()
-    if modell is None:
-        return
+    # Modell laden (nur PyCaret-Backend) und Prognose erstellen
+    modell = None
+    if PROGNOSE_BACKEND == 'pycaret':
+        modell = lade_modell()
+        pruefe_nachtraining()
+        zeige_trainingsstatus()
+        zeige_modellversionen()
+        if st.button("Modell neu trainieren", disabled=training_laeuft()):
+            trainiere_modell()
+            st.rerun()
+        if modell is None:
+            return
 
-    prognosedaten = erstelle_prognosedaten(teilnehmer_id)
-    if prognosedaten is None:
+    vorhersagen = erstelle_prognose(teilnehmer_id, modell)
+    if vorhersagen is None:
         return
 
-    vorhersagen = generiere_prognosen(modell, prognosedaten)
-    vorhersagen['Tage'] = prognosedaten['Tage']
-
     # Prognosediagramm zeichnen
-    zeichne_prognosediagramm(vorhersagen)
+    interaktiv = st.toggle("Interaktives Diagramm", value=DIAGRAMM_MODUS == 'interaktiv')
+    zeichne_prognosediagramm(vorhersagen, teilnehmer_id, interaktiv)
+
+    # Übersicht über alle aktiven Teilnehmer
+    st.subheader("Prognoseübersicht aller aktiven Teilnehmer")
+    if st.checkbox("Übersicht anzeigen"):
+        alle = erstelle_prognosen_batch(modell)
+        if alle.empty:
+            st.info("Keine Testergebnisse aktiver Teilnehmer vorhanden.")
+            return
+        uebersicht = alle[alle['Tage'].isin([0, PROGNOSE_TAGE[-1]])].pivot(
+            index=['teilnehmer_id', 'name'], columns='Tage', values='gesamt_prozent'
+        )
+        uebersicht.columns = ["Heute (%)", f"In {PROGNOSE_TAGE[-1]} Tagen (%)"]
+        st.dataframe(uebersicht.reset_index().sort_values("Heute (%)"))
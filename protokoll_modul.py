@@ -0,0 +1,70 @@
+import json
+from datetime import datetime
+from datenbank_modul import lese_abfrage
+
+# Spalten des Änderungsprotokolls in Lesereihenfolge
+PROTOKOLL_SPALTEN = ['seq', 'zeitpunkt', 'tabelle', 'datensatz_id', 'aktion', 'daten']
+
+# Höchstzahl der Einträge je Leseaufruf
+MAX_AENDERUNGEN = 10000
+
+
+# Schreiben (immer in der Transaktion der eigentlichen Änderung)
+def _zeitpunkt():
+    return datetime.now().isoformat(timespec='seconds')
+
+def protokolliere_einfuegungen(cursor, tabelle, spalten, ab_id):
+    """Protokolliert alle Zeilen von `tabelle` mit id > ab_id als Einfügungen.
+
+    Die Werte werden in SQL als JSON-Objekt gelesen; so kostet auch ein
+    Import mit vielen Zeilen nur eine zusätzliche Anweisung.
+    """
+    cursor.execute(f'''
+    INSERT INTO aenderungsprotokoll (zeitpunkt, tabelle, datensatz_id, aktion, daten)
+    SELECT ?, '{tabelle}', id, 'insert', json_object({', '.join(f"'{spalte}', {spalte}" for spalte in spalten)})
+    FROM {tabelle} WHERE id > ? ORDER BY id
+    ''', (_zeitpunkt(), ab_id))
+
+def protokolliere_aenderung(cursor, tabelle, datensatz_id, aktion, daten):
+    """Protokolliert eine einzelne Änderung; `daten` wird als JSON gespeichert."""
+    cursor.execute('''
+    INSERT INTO aenderungsprotokoll (zeitpunkt, tabelle, datensatz_id, aktion, daten)
+    VALUES (?, ?, ?, ?, ?)
+    ''', (_zeitpunkt(), tabelle, datensatz_id, aktion, json.dumps(daten, ensure_ascii=False)))
+
+
+# Lesen
+def lese_aenderungen(seit_seq=0, limit=1000, tabelle=None):
+    """Liest bis zu `limit` Änderungen mit seq > seit_seq in Reihenfolge.
+
+    Die höchste gelieferte seq ist der Cursor für den nächsten Aufruf; ein
+    leeres Ergebnis bedeutet, dass alle Änderungen gelesen sind.
+    """
+    limit = min(limit, MAX_AENDERUNGEN)
+    if tabelle is None:
+        aenderungen = lese_abfrage(f'''
+        SELECT {', '.join(PROTOKOLL_SPALTEN)} FROM aenderungsprotokoll
+        WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (seit_seq, limit))
+    else:
+        aenderungen = lese_abfrage(f'''
+        SELECT {', '.join(PROTOKOLL_SPALTEN)} FROM aenderungsprotokoll
+        WHERE seq > ? AND tabelle = ? ORDER BY seq LIMIT ?
+        ''', (seit_seq, tabelle, limit))
+    aenderungen['daten'] = aenderungen['daten'].map(json.loads)
+    return aenderungen
+
+def zaehle_aenderungen(seit_seq=0, tabelle=None, aktion=None):
+    """Zählt die Änderungen mit seq > seit_seq (optional je Tabelle und Aktion)."""
+    bedingungen, parameter = ['seq > ?'], [seit_seq]
+    for spalte, wert in (('tabelle', tabelle), ('aktion', aktion)):
+        if wert is not None:
+            bedingungen.append(f'{spalte} = ?')
+            parameter.append(wert)
+    anzahl = lese_abfrage(f"SELECT COUNT(*) AS anzahl FROM aenderungsprotokoll WHERE {' AND '.join(bedingungen)}", parameter)
+    return int(anzahl['anzahl'].iloc[0])
+
+def letzte_sequenz():
+    """Höchste vergebene Sequenznummer (0 bei leerem Protokoll)."""
+    seq = lese_abfrage('SELECT COALESCE(MAX(seq), 0) AS seq FROM aenderungsprotokoll')['seq'].iloc[0]
+    return int(seq)
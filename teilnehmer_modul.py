@@ -1,29 +1,22 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
+import numpy as np
 from datetime import date, datetime
 import re
-import os
-
-# Absoluter Pfad zur Datenbank im temporären Verzeichnis
-datenbank_pfad = os.path.join('/tmp', 'mathematik_kurs.db')
-
-# Verbindung zur Datenbank
-verbindung = sqlite3.connect(datenbank_pfad, check_same_thread=False)
-cursor = verbindung.cursor()
-
-# Tabelle initialisieren
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS teilnehmer (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    sv_nummer TEXT NOT NULL UNIQUE,
-    berufswunsch TEXT NOT NULL,
-    eintrittsdatum TEXT NOT NULL,
-    austrittsdatum TEXT NOT NULL
-)
-''')
-verbindung.commit()
+from datenbank_modul import lese_abfrage_gecacht, schreib_transaktion
+from protokoll_modul import protokolliere_aenderung, protokolliere_einfuegungen
+
+# Spalten eines Teilnehmers in Einfügereihenfolge
+TEILNEHMER_SPALTEN = ['name', 'sv_nummer', 'berufswunsch', 'eintrittsdatum', 'austrittsdatum']
+
+# Teilnehmerliste: Zeilen pro Seite und erlaubte Sortierspalten (Anzeigename -> Spalte)
+SEITENGROESSE = 50
+SORTIERSPALTEN = {
+    'ID': 'id', 'Name': 'name', 'Berufswunsch': 'berufswunsch',
+    'Eintrittsdatum': 'eintrittsdatum', 'Austrittsdatum': 'austrittsdatum'
+}
+
+# Maximale Anzahl Treffer im Teilnehmer-Auswahlfeld
+MAX_AUSWAHL = 200
 
 # Hilfsfunktionen
 def berechne_alter(sv_nummer):
@@ -36,47 +29,134 @@ def ist_aktiv(austrittsdatum):
     """Prüft, ob ein Teilnehmer aktiv ist (Austrittsdatum > heute)."""
     return datetime.strptime(austrittsdatum, '%Y-%m-%d').date() > date.today()
 
+def berechne_alter_vektor(sv_nummern, stichtag=None):
+    """Berechnet das Alter für eine ganze Spalte von SV-Nummern auf einmal."""
+    stichtag = stichtag or date.today()
+    tag = sv_nummern.str[4:6].astype(int).to_numpy()
+    monat = sv_nummern.str[6:8].astype(int).to_numpy()
+    jahr = sv_nummern.str[8:10].astype(int).to_numpy()
+    jahr = jahr + np.where(jahr <= stichtag.year % 100, 2000, 1900)
+    noch_kein_geburtstag = (monat > stichtag.month) | ((monat == stichtag.month) & (tag > stichtag.day))
+    return stichtag.year - jahr - noch_kein_geburtstag
+
+def ergaenze_alter_und_status(teilnehmer_df, stichtag=None):
+    """Ergänzt die Spalten Alter und Status vektorisiert (ISO-Daten sind als Text vergleichbar)."""
+    stichtag = stichtag or date.today()
+    teilnehmer_df['Alter'] = berechne_alter_vektor(teilnehmer_df['sv_nummer'], stichtag)
+    teilnehmer_df['Status'] = np.where(teilnehmer_df['austrittsdatum'] > stichtag.isoformat(), 'Aktiv', 'Inaktiv')
+    return teilnehmer_df
+
+def _teilnehmer_filter(nur_aktive, suchtext):
+    """Baut die WHERE-Klausel für Status- und Textfilter."""
+    bedingungen, parameter = [], []
+    if nur_aktive:
+        bedingungen.append('austrittsdatum > ?')
+        parameter.append(date.today().isoformat())
+    if suchtext:
+        bedingungen.append('(name LIKE ? OR sv_nummer LIKE ? OR berufswunsch LIKE ?)')
+        parameter.extend([f"%{suchtext}%"] * 3)
+    where = f"WHERE {' AND '.join(bedingungen)}" if bedingungen else ''
+    return where, parameter
+
+def zaehle_teilnehmer(nur_aktive=True, suchtext=''):
+    """Zählt die Teilnehmer, die dem Filter entsprechen."""
+    where, parameter = _teilnehmer_filter(nur_aktive, suchtext)
+    anzahl = lese_abfrage_gecacht(f'SELECT COUNT(*) AS anzahl FROM teilnehmer {where}', parameter, ('teilnehmer',))
+    return int(anzahl['anzahl'].iloc[0])
+
+def lade_teilnehmerseite(seite, seitengroesse=SEITENGROESSE, sortierung='id', absteigend=False, nur_aktive=True, suchtext=''):
+    """Lädt eine Seite der Teilnehmerliste; Filter, Sortierung und Paginierung laufen in SQL."""
+    if sortierung not in SORTIERSPALTEN.values():
+        raise ValueError(f"Unbekannte Sortierspalte: {sortierung}")
+    where, parameter = _teilnehmer_filter(nur_aktive, suchtext)
+    richtung = 'DESC' if absteigend else 'ASC'
+    return lese_abfrage_gecacht(
+        f'SELECT * FROM teilnehmer {where} ORDER BY {sortierung} {richtung}, id {richtung} LIMIT ? OFFSET ?',
+        parameter + [seitengroesse, seite * seitengroesse], ('teilnehmer',)
+    )
+
+def waehle_teilnehmer(label="Teilnehmer auswählen", key='teilnehmer'):
+    """Durchsuchbare Teilnehmerauswahl; gibt (id, name) oder None zurück.
+
+    Es werden nur die Treffer der Suche geladen (höchstens MAX_AUSWAHL),
+    nicht die Auswahltexte aller Teilnehmer.
+    """
+    suchtext = st.text_input(f"{label} (Suche nach Name oder ID)", key=f"{key}_suche").strip()
+    if suchtext.isdigit():
+        treffer = lese_abfrage_gecacht('SELECT id, name FROM teilnehmer WHERE id = ? OR name LIKE ? ORDER BY name, id LIMIT ?',
+                                       (int(suchtext), f"%{suchtext}%", MAX_AUSWAHL), ('teilnehmer',))
+    else:
+        treffer = lese_abfrage_gecacht('SELECT id, name FROM teilnehmer WHERE name LIKE ? ORDER BY name, id LIMIT ?',
+                                       (f"%{suchtext}%", MAX_AUSWAHL), ('teilnehmer',))
+    if treffer.empty:
+        st.info("Keine passenden Teilnehmer gefunden.")
+        return None
+
+    namen = dict(zip(treffer['id'].tolist(), treffer['name'].tolist()))
+    teilnehmer_id = st.selectbox(label, list(namen), format_func=lambda i: f"{namen[i]} (ID: {i})", key=key)
+    if len(treffer) == MAX_AUSWAHL:
+        st.caption(f"Es werden die ersten {MAX_AUSWAHL} Treffer angezeigt. Suche verfeinern für weitere.")
+    return teilnehmer_id, namen[teilnehmer_id]
+
 def aktualisiere_austrittsdatum(teilnehmer_id, neues_datum):
-    """Aktualisiert das Austrittsdatum eines Teilnehmers."""
-    cursor.execute('UPDATE teilnehmer SET austrittsdatum = ? WHERE id = ?', (neues_datum, teilnehmer_id))
-    verbindung.commit()
+    """Aktualisiert das Austrittsdatum eines Teilnehmers und protokolliert alten und neuen Wert."""
+    with schreib_transaktion(aendert=('teilnehmer',)) as cursor:
+        cursor.execute('SELECT austrittsdatum FROM teilnehmer WHERE id = ?', (teilnehmer_id,))
+        zeile = cursor.fetchone()
+        if zeile is None or zeile[0] == neues_datum:
+            return
+        cursor.execute('UPDATE teilnehmer SET austrittsdatum = ? WHERE id = ?', (neues_datum, teilnehmer_id))
+        protokolliere_aenderung(cursor, 'teilnehmer', teilnehmer_id, 'update',
+                                {'austrittsdatum': {'alt': zeile[0], 'neu': neues_datum}})
 
-def teilnehmer_hinzufuegen(name, sv_nummer, berufswunsch, eintrittsdatum, austrittsdatum):
-    """Fügt einen neuen Teilnehmer zur Datenbank hinzu."""
-    cursor.execute('''
+def speichere_teilnehmer(cursor, zeilen):
+    """Fügt Teilnehmer (Tupel in Reihenfolge von TEILNEHMER_SPALTEN) in einer laufenden Transaktion ein.
+
+    Die neuen Zeilen werden in derselben Transaktion ins Änderungsprotokoll übernommen.
+    """
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM teilnehmer')
+    letzte_id = cursor.fetchone()[0]
+    cursor.executemany('''
     INSERT INTO teilnehmer (name, sv_nummer, berufswunsch, eintrittsdatum, austrittsdatum)
     VALUES (?, ?, ?, ?, ?)
-    ''', (name, sv_nummer, berufswunsch, eintrittsdatum, austrittsdatum))
-    verbindung.commit()
+    ''', zeilen)
+    protokolliere_einfuegungen(cursor, 'teilnehmer', TEILNEHMER_SPALTEN, letzte_id)
+
+def teilnehmer_hinzufuegen(name, sv_nummer, berufswunsch, eintrittsdatum, austrittsdatum):
+    """Fügt einen neuen Teilnehmer zur Datenbank hinzu."""
+    with schreib_transaktion(aendert=('teilnehmer',)) as cursor:
+        speichere_teilnehmer(cursor, [(name, sv_nummer, berufswunsch, eintrittsdatum, austrittsdatum)])
 
 # Teilnehmerverwaltung
 def teilnehmerverwaltung():
     st.header("Teilnehmerverwaltung")
 
-    # Teilnehmer anzeigen
-    teilnehmer_df = pd.read_sql_query('SELECT * FROM teilnehmer', verbindung)
-    if not teilnehmer_df.empty:
-        teilnehmer_df['Alter'] = teilnehmer_df['sv_nummer'].apply(berechne_alter)
-        teilnehmer_df['Status'] = teilnehmer_df['austrittsdatum'].apply(lambda x: 'Aktiv' if ist_aktiv(x) else 'Inaktiv')
+    # Teilnehmer anzeigen (Filter, Sortierung und Seiten werden in SQL umgesetzt)
+    spalte_filter, spalte_sortierung, spalte_richtung = st.columns([2, 1, 1])
+    suchtext = spalte_filter.text_input("Teilnehmer filtern (Name, SV-Nummer, Berufswunsch)").strip()
+    sortierung = spalte_sortierung.selectbox("Sortieren nach", list(SORTIERSPALTEN))
+    absteigend = spalte_richtung.selectbox("Reihenfolge", ["Aufsteigend", "Absteigend"]) == "Absteigend"
+    nur_aktive = not st.checkbox("Inaktive Teilnehmer anzeigen")
 
-        # Teilnehmer filtern und anzeigen
-        if st.checkbox("Inaktive Teilnehmer anzeigen"):
-            st.dataframe(teilnehmer_df)
-        else:
-            aktive_df = teilnehmer_df[teilnehmer_df['Status'] == 'Aktiv']
-            st.dataframe(aktive_df)
-
-        # Austrittsdatum aktualisieren
-        st.subheader("Austrittsdatum aktualisieren")
-        teilnehmer_df['Auswahl'] = teilnehmer_df.apply(lambda row: f"{row['name']} (ID: {row['id']})", axis=1)
-        ausgewaehlter = st.selectbox("Teilnehmer auswählen", teilnehmer_df['Auswahl'])
-        teilnehmer_id = int(ausgewaehlter.split("ID: ")[1].strip(')'))
+    anzahl = zaehle_teilnehmer(nur_aktive, suchtext)
+    if anzahl > 0:
+        seiten = (anzahl + SEITENGROESSE - 1) // SEITENGROESSE
+        seite = st.number_input(f"Seite (von {seiten})", min_value=1, max_value=seiten, value=1) - 1
+        teilnehmer_df = lade_teilnehmerseite(seite, SEITENGROESSE, SORTIERSPALTEN[sortierung], absteigend, nur_aktive, suchtext)
+        st.dataframe(ergaenze_alter_und_status(teilnehmer_df), hide_index=True)
+        st.caption(f"{anzahl} Teilnehmer")
+    else:
+        st.write("Keine Teilnehmer vorhanden.")
+
+    # Austrittsdatum aktualisieren
+    st.subheader("Austrittsdatum aktualisieren")
+    auswahl = waehle_teilnehmer(key='austritt_teilnehmer')
+    if auswahl is not None:
+        teilnehmer_id, _ = auswahl
         neues_datum = st.date_input("Neues Austrittsdatum", date.today())
         if st.button("Austrittsdatum aktualisieren"):
             aktualisiere_austrittsdatum(teilnehmer_id, neues_datum.strftime('%Y-%m-%d'))
             st.success("Austrittsdatum erfolgreich aktualisiert!")
-    else:
-        st.write("Keine Teilnehmer vorhanden.")
 
     # Teilnehmer hinzufügen
     st.subheader("Neuen Teilnehmer hinzufügen")
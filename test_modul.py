@@ -1,113 +1,150 @@
 import streamlit as st
-import sqlite3
 from datetime import date
+import numpy as np
 import pandas as pd
-import os
-
-# Absoluter Pfad zur Datenbank im temporären Verzeichnis
-datenbank_pfad = os.path.join('/tmp', 'mathematik_kurs.db')
-
-# Verbindung zur Datenbank
-verbindung = sqlite3.connect(datenbank_pfad, check_same_thread=False)
-cursor = verbindung.cursor()
-
-# Tabelle für Testergebnisse initialisieren
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS testergebnisse (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    teilnehmer_id INTEGER NOT NULL,
-    test_datum TEXT NOT NULL,
-    textaufgaben_erreicht INTEGER NOT NULL,
-    textaufgaben_max INTEGER NOT NULL,
-    raumvorstellung_erreicht INTEGER NOT NULL,
-    raumvorstellung_max INTEGER NOT NULL,
-    gleichungen_erreicht INTEGER NOT NULL,
-    gleichungen_max INTEGER NOT NULL,
-    brueche_erreicht INTEGER NOT NULL,
-    brueche_max INTEGER NOT NULL,
-    grundrechenarten_erreicht INTEGER NOT NULL,
-    grundrechenarten_max INTEGER NOT NULL,
-    zahlenraum_erreicht INTEGER NOT NULL,
-    zahlenraum_max INTEGER NOT NULL,
-    gesamt_prozent REAL NOT NULL,
-    FOREIGN KEY (teilnehmer_id) REFERENCES teilnehmer (id)
-)
-''')
-verbindung.commit()
+from datenbank_modul import DatenbankFehler, lese_abfrage_gecacht, schreib_transaktion
+from teilnehmer_modul import MAX_AUSWAHL, lade_teilnehmerseite, zaehle_teilnehmer, waehle_teilnehmer
+from analyse_modul import aktualisiere_zusammenfassung
+from protokoll_modul import protokolliere_einfuegungen
+from prognose_modul import KATEGORIEN, PROZENT_SPALTEN, pruefe_nachtraining
+
+# Spalten eines Testergebnisses in Einfügereihenfolge
+TESTERGEBNIS_SPALTEN = [
+    'teilnehmer_id', 'test_datum',
+    'textaufgaben_erreicht', 'textaufgaben_max',
+    'raumvorstellung_erreicht', 'raumvorstellung_max',
+    'gleichungen_erreicht', 'gleichungen_max',
+    'brueche_erreicht', 'brueche_max',
+    'grundrechenarten_erreicht', 'grundrechenarten_max',
+    'zahlenraum_erreicht', 'zahlenraum_max',
+    'gesamt_prozent'
+]
+ERREICHT_SPALTEN = [f"{praefix}_erreicht" for praefix, _ in KATEGORIEN]
+MAX_SPALTEN = [f"{praefix}_max" for praefix, _ in KATEGORIEN]
+# Beim Speichern berechnete Prozentwerte je Kategorie kommen hinzu (Migration 6)
+GESPEICHERTE_SPALTEN = TESTERGEBNIS_SPALTEN + PROZENT_SPALTEN
+
+# Vorgabe der Maximalpunkte je Kategorie in der Klasseneingabe (Summe 100)
+MAXIMALPUNKTE_VORGABE = [20, 15, 20, 15, 15, 15]
 
 # Hilfsfunktionen
-def berechne_prozent(erreichte_punkte, maximale_punkte):
-    """Berechnet den Prozentwert einer Kategorie."""
-    return (erreichte_punkte / maximale_punkte) * 100 if maximale_punkte > 0 else 0
+def berechne_prozente(erreicht, maximum):
+    """Berechnet Kategorie- und Gesamtprozente für ganze Punktetabellen (Zeilen x Kategorien).
+
+    Gibt (Kategorie-Prozente, Gesamtprozente) zurück; Maximalpunkte 0 ergeben 0 %.
+    """
+    erreicht = np.asarray(erreicht, dtype=float)
+    maximum = np.asarray(maximum, dtype=float)
+    kategorien = np.divide(erreicht * 100, maximum, out=np.zeros_like(erreicht), where=maximum > 0)
+    summe_max = maximum.sum(axis=1)
+    gesamt = np.divide(erreicht.sum(axis=1) * 100, summe_max, out=np.zeros_like(summe_max), where=summe_max > 0)
+    return kategorien, gesamt
+
+def pruefe_punkte(erreicht, maximum):
+    """Prüft Punktetabellen (Zeilen x Kategorien, NaN = fehlt) vektorisiert.
+
+    Gibt eine Liste (Zeilenmaske, Fehlermeldung) zurück; Regeln auf den
+    Punktwerten gelten nur für vollständig ausgefüllte Zeilen.
+    """
+    erreicht = np.asarray(erreicht, dtype=float)
+    maximum = np.asarray(maximum, dtype=float)
+    werte = np.hstack([erreicht, maximum])
+    fehlt = np.isnan(werte).any(axis=1)
+    with np.errstate(invalid='ignore'):
+        return [
+            (fehlt, "Punkte fehlen oder sind keine Zahlen"),
+            (~fehlt & ((werte < 0) | (np.mod(werte, 1) != 0)).any(axis=1), "Punkte müssen ganze Zahlen ≥ 0 sein"),
+            (~fehlt & (erreicht > maximum).any(axis=1), "Erreichte Punkte größer als maximale Punkte"),
+            (~fehlt & (maximum.sum(axis=1) != 100), "Die Summe der maximalen Punkte aller Kategorien muss genau 100 betragen"),
+        ]
+
+def speichere_testergebnisse(cursor, ergebnisse):
+    """Fügt Testergebnisse (DataFrame mit den Spalten aus TESTERGEBNIS_SPALTEN) in einer laufenden Transaktion ein.
+
+    Gesamt- und Kategorieprozente werden vektorisiert aus den Punkten berechnet
+    und mitgespeichert. Kohorten-Zusammenfassung und Änderungsprotokoll werden
+    in derselben Transaktion ergänzt.
+    """
+    if ergebnisse.empty:
+        return
+    ergebnisse = ergebnisse[TESTERGEBNIS_SPALTEN[:-1]].copy()
+    kategorien, gesamt = berechne_prozente(ergebnisse[ERREICHT_SPALTEN], ergebnisse[MAX_SPALTEN])
+    ergebnisse['gesamt_prozent'] = gesamt
+    ergebnisse[PROZENT_SPALTEN] = kategorien
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM testergebnisse')
+    letzte_id = cursor.fetchone()[0]
+    # tolist() je Spalte liefert Python-Werte: die Datenbanktreiber binden keine NumPy-Typen
+    cursor.executemany(f'''
+    INSERT INTO testergebnisse ({', '.join(GESPEICHERTE_SPALTEN)})
+    VALUES ({', '.join('?' * len(GESPEICHERTE_SPALTEN))})
+    ''', zip(*(ergebnisse[spalte].tolist() for spalte in GESPEICHERTE_SPALTEN)))
+    aktualisiere_zusammenfassung(cursor, letzte_id)
+    protokolliere_einfuegungen(cursor, 'testergebnisse', GESPEICHERTE_SPALTEN, letzte_id)
+
+def fuege_testergebnisse_hinzu(ergebnisse):
+    """Speichert mehrere Testergebnisse in einer Transaktion; gibt True bei Erfolg zurück."""
+    try:
+        with schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+            speichere_testergebnisse(cursor, ergebnisse)
+    except DatenbankFehler as e:
+        st.error(f"Ein Fehler ist beim Einfügen in die Datenbank aufgetreten: {e}")
+        return False
+    # Bei genügend neuen Ergebnissen das Modell im Hintergrund nachtrainieren
+    pruefe_nachtraining()
+    return True
 
 def fuege_testergebnis_hinzu(teilnehmer_id, test_datum, ergebnisse):
     """Speichert ein Testergebnis in der Datenbank."""
     try:
         # Validierung der Ergebnisse
-        for kategorie in [
-            'Textaufgaben', 'Raumvorstellung', 'Gleichungen',
-            'Brüche', 'Grundrechenarten', 'Zahlenraum'
-        ]:
+        for _, kategorie in KATEGORIEN:
             if 'erreicht' not in ergebnisse[kategorie] or 'max' not in ergebnisse[kategorie]:
                 raise ValueError(f"Fehlende Daten für Kategorie: {kategorie}")
-
-        # SQL-Insert ausführen
-        cursor.execute('''
-        INSERT INTO testergebnisse (
-            teilnehmer_id, test_datum,
-            textaufgaben_erreicht, textaufgaben_max,
-            raumvorstellung_erreicht, raumvorstellung_max,
-            gleichungen_erreicht, gleichungen_max,
-            brueche_erreicht, brueche_max,
-            grundrechenarten_erreicht, grundrechenarten_max,
-            zahlenraum_erreicht, zahlenraum_max,
-            gesamt_prozent
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            teilnehmer_id, test_datum,
-            ergebnisse['Textaufgaben']['erreicht'], ergebnisse['Textaufgaben']['max'],
-            ergebnisse['Raumvorstellung']['erreicht'], ergebnisse['Raumvorstellung']['max'],
-            ergebnisse['Gleichungen']['erreicht'], ergebnisse['Gleichungen']['max'],
-            ergebnisse['Brüche']['erreicht'], ergebnisse['Brüche']['max'],
-            ergebnisse['Grundrechenarten']['erreicht'], ergebnisse['Grundrechenarten']['max'],
-            ergebnisse['Zahlenraum']['erreicht'], ergebnisse['Zahlenraum']['max'],
-            ergebnisse['gesamt_prozent']
-        ))
-        verbindung.commit()
-    except sqlite3.Error as e:
-        st.error(f"Ein Fehler ist beim Einfügen in die Datenbank aufgetreten: {e}")
     except ValueError as e:
         st.error(str(e))
+        return False
+
+    zeile = {'teilnehmer_id': teilnehmer_id, 'test_datum': test_datum}
+    for praefix, kategorie in KATEGORIEN:
+        zeile[f"{praefix}_erreicht"] = ergebnisse[kategorie]['erreicht']
+        zeile[f"{praefix}_max"] = ergebnisse[kategorie]['max']
+    return fuege_testergebnisse_hinzu(pd.DataFrame([zeile]))
 
 # Testverwaltung
 def testverwaltung():
     st.header("Testverwaltung")
 
     # Teilnehmerdaten abrufen
-    teilnehmer_df = pd.read_sql_query('SELECT id, name FROM teilnehmer', verbindung)
-    if teilnehmer_df.empty:
+    if zaehle_teilnehmer(nur_aktive=False) == 0:
         st.warning("Keine Teilnehmer vorhanden. Bitte zuerst Teilnehmer hinzufügen.")
         return
 
+    modus = st.radio("Eingabe", ["Einzelner Teilnehmer", "Ganze Klasse"], horizontal=True)
+    if modus == "Ganze Klasse":
+        klasseneingabe()
+    else:
+        einzeleingabe()
+
+def einzeleingabe():
+    """Erfasst das Testergebnis eines einzelnen Teilnehmers."""
     # Teilnehmer auswählen
-    teilnehmer_df['Auswahl'] = teilnehmer_df.apply(lambda x: f"{x['name']} (ID: {x['id']})", axis=1)
-    ausgewaehlter = st.selectbox("Teilnehmer auswählen", teilnehmer_df['Auswahl'])
-    teilnehmer_id = int(ausgewaehlter.split("ID: ")[1].strip(')'))
-    st.subheader(f"Testergebnisse für {teilnehmer_df[teilnehmer_df['id'] == teilnehmer_id]['name'].values[0]}")
+    auswahl = waehle_teilnehmer()
+    if auswahl is None:
+        return
+    teilnehmer_id, name = auswahl
+    st.subheader(f"Testergebnisse für {name}")
 
     # Testdaten eingeben
     test_datum = st.date_input("Testdatum", date.today())
-    kategorien = ["Textaufgaben", "Raumvorstellung", "Gleichungen", "Brüche", "Grundrechenarten", "Zahlenraum"]
     ergebnisse = {}
     total_max_punkte = 0
-    gesamt_erreichte_punkte = 0
 
-    for kategorie in kategorien:
+    for _, kategorie in KATEGORIEN:
         st.markdown(f"### {kategorie}")
         erreicht = st.number_input(f"{kategorie} - Erreichte Punkte", min_value=0, value=0, key=f"{kategorie}_erreicht")
         max_punkte = st.number_input(f"{kategorie} - Maximale Punkte", min_value=1, value=1, key=f"{kategorie}_max")
         total_max_punkte += max_punkte
-        gesamt_erreichte_punkte += erreicht
         ergebnisse[kategorie] = {'erreicht': erreicht, 'max': max_punkte}
 
     # Validierung der Punktesumme
@@ -117,16 +154,103 @@ def testverwaltung():
 
     # Ergebnisse speichern
     if st.button("Testergebnis hinzufügen"):
-        gesamt_prozent = berechne_prozent(gesamt_erreichte_punkte, total_max_punkte)
-        ergebnisse['gesamt_prozent'] = gesamt_prozent
-        fuege_testergebnis_hinzu(teilnehmer_id, test_datum.strftime('%Y-%m-%d'), ergebnisse)
-        st.success("Testergebnis erfolgreich hinzugefügt!")
+        if fuege_testergebnis_hinzu(teilnehmer_id, test_datum.strftime('%Y-%m-%d'), ergebnisse):
+            st.success("Testergebnis erfolgreich hinzugefügt!")
 
     # Vorhandene Testergebnisse anzeigen
     st.subheader("Vorhandene Testergebnisse")
-    testergebnisse_df = pd.read_sql_query(f'SELECT * FROM testergebnisse WHERE teilnehmer_id = {teilnehmer_id}', verbindung)
+    testergebnisse_df = lese_abfrage_gecacht('SELECT * FROM testergebnisse WHERE teilnehmer_id = ?', (teilnehmer_id,), ('testergebnisse',))
     if not testergebnisse_df.empty:
         testergebnisse_df['Testdatum'] = pd.to_datetime(testergebnisse_df['test_datum']).dt.strftime('%d.%m.%Y')
         st.dataframe(testergebnisse_df[["Testdatum", "gesamt_prozent"]])
     else:
         st.info("Keine Testergebnisse vorhanden.")
+
+def _uebernimm_klassenpunkte(schluessel, teilnehmer):
+    """Überträgt die Änderungen der Tabelle in die filterunabhängigen Klassenpunkte (je Teilnehmer-ID)."""
+    punkte = st.session_state.setdefault('klasse_punkte', {})
+    for zeile, aenderungen in st.session_state[schluessel]['edited_rows'].items():
+        teilnehmer_id, name = teilnehmer[int(zeile)]
+        punkte.setdefault(teilnehmer_id, {'Name': name}).update(aenderungen)
+
+def klasseneingabe():
+    """Erfasst die Ergebnisse eines Klassentests für alle aktiven Teilnehmer in einer Tabelle.
+
+    Die eingetragenen Punkte liegen je Teilnehmer-ID im Session State und
+    bleiben beim Filtern erhalten. Geprüft und berechnet wird über alle
+    Einträge auf einmal; gespeichert wird in einer einzigen Transaktion.
+    Leere Zeilen (nicht mitgeschrieben) werden übergangen.
+    """
+    if meldung := st.session_state.pop('klasse_gespeichert', None):
+        st.success(meldung)
+    test_datum = st.date_input("Testdatum", date.today(), key='klasse_datum')
+
+    # Gemeinsame Maximalpunkte für alle Teilnehmer
+    st.markdown("### Maximale Punkte")
+    spalten = st.columns(len(KATEGORIEN))
+    maximum = np.array([
+        spalte.number_input(kategorie, min_value=1, value=vorgabe, key=f"klasse_{praefix}_max")
+        for spalte, (praefix, kategorie), vorgabe in zip(spalten, KATEGORIEN, MAXIMALPUNKTE_VORGABE)
+    ], dtype=float)
+    if maximum.sum() != 100:
+        st.error("Die Summe der maximalen Punkte aller Kategorien muss genau 100 betragen.")
+        return
+
+    # Erreichte Punkte je aktivem Teilnehmer
+    st.markdown("### Erreichte Punkte")
+    suchtext = st.text_input("Teilnehmer filtern (Name, SV-Nummer oder Berufswunsch)", key='klasse_suche').strip()
+    teilnehmer = lade_teilnehmerseite(0, seitengroesse=MAX_AUSWAHL, sortierung='name', suchtext=suchtext)
+    if teilnehmer.empty:
+        st.info("Keine passenden aktiven Teilnehmer gefunden.")
+    else:
+        if len(teilnehmer) == MAX_AUSWAHL:
+            st.caption(f"Es werden die ersten {MAX_AUSWAHL} aktiven Teilnehmer angezeigt. Filter verfeinern für weitere.")
+        punkte = st.session_state.get('klasse_punkte', {})
+        raster = pd.DataFrame({'ID': teilnehmer['id'], 'Name': teilnehmer['name']})
+        for _, kategorie in KATEGORIEN:
+            raster[kategorie] = pd.Series(
+                [punkte.get(teilnehmer_id, {}).get(kategorie) for teilnehmer_id in raster['ID'].tolist()], dtype=float
+            )
+        # Zeilennummern der Tabelle gelten nur für diesen Filter; die Werte selbst liegen in klasse_punkte
+        schluessel = f"klasse_raster_{st.session_state.get('klasse_durchgang', 0)}_{suchtext}"
+        st.data_editor(
+            raster, hide_index=True, disabled=['ID', 'Name'], key=schluessel,
+            column_config={kategorie: st.column_config.NumberColumn(min_value=0, step=1) for _, kategorie in KATEGORIEN},
+            on_change=_uebernimm_klassenpunkte,
+            args=(schluessel, list(zip(raster['ID'].tolist(), raster['Name'].tolist()))),
+        )
+
+    # Vektorisierte Prüfung über alle eingetragenen Zeilen, auch außerhalb des Filters
+    eintraege = pd.DataFrame.from_dict(st.session_state.get('klasse_punkte', {}), orient='index')
+    kategorien = [kategorie for _, kategorie in KATEGORIEN]
+    eintraege = eintraege.reindex(columns=['Name'] + kategorien)
+    erreicht = eintraege[kategorien].to_numpy(dtype=float)
+    belegt = ~np.isnan(erreicht).all(axis=1)
+    ausgefuellt, erreicht = eintraege[belegt], erreicht[belegt]
+    if ausgefuellt.empty:
+        st.info("Noch keine Punkte eingetragen.")
+        return
+    maxima = np.broadcast_to(maximum, erreicht.shape)
+    fehler = pd.Series('', index=ausgefuellt.index)
+    for maske, meldung in pruefe_punkte(erreicht, maxima):
+        fehler = fehler.where(~maske, fehler + meldung + '; ')
+    ungueltig = fehler != ''
+    if ungueltig.any():
+        st.error(f"{int(ungueltig.sum())} Zeilen sind fehlerhaft.")
+        st.dataframe(pd.DataFrame({'Name': ausgefuellt['Name'][ungueltig], 'Fehler': fehler[ungueltig].str.rstrip('; ')}),
+                     hide_index=True)
+        return
+
+    _, gesamt = berechne_prozente(erreicht, maxima)
+    st.caption(f"{len(ausgefuellt)} Testergebnisse, Durchschnitt {gesamt.mean():.1f} %")
+    if st.button(f"{len(ausgefuellt)} Testergebnisse speichern"):
+        ergebnisse = pd.DataFrame({'teilnehmer_id': ausgefuellt.index.to_numpy(), 'test_datum': test_datum.strftime('%Y-%m-%d')})
+        for i, (praefix, _) in enumerate(KATEGORIEN):
+            ergebnisse[f"{praefix}_erreicht"] = erreicht[:, i].astype(int)
+            ergebnisse[f"{praefix}_max"] = int(maximum[i])
+        if fuege_testergebnisse_hinzu(ergebnisse):
+            # Tabelle leeren: ein zweiter Klick darf die Klasse nicht erneut speichern
+            st.session_state['klasse_punkte'] = {}
+            st.session_state['klasse_durchgang'] = st.session_state.get('klasse_durchgang', 0) + 1
+            st.session_state['klasse_gespeichert'] = f"{len(ergebnisse)} Testergebnisse erfolgreich hinzugefügt!"
+            st.rerun()
@@ -0,0 +1,187 @@
+"""Speicherschicht gegen beide Backends: SqliteSpeicher und SqlAlchemySpeicher (sqlite:///...).
+
+Aufruf aus dem Projektverzeichnis:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datenbank_modul  # noqa: E402
+from analyse_modul import SUMMEN_SPALTEN  # noqa: E402
+from datenbank_modul import lese_abfrage, passe_sql_an, schreib_transaktion, speicher  # noqa: E402
+import migration_modul  # noqa: E402
+from migration_modul import MIGRATIONEN, migriere  # noqa: E402
+from prognose_modul import PROZENT_SPALTEN  # noqa: E402
+from protokoll_modul import lese_aenderungen, letzte_sequenz, zaehle_aenderungen  # noqa: E402
+from teilnehmer_modul import speichere_teilnehmer  # noqa: E402
+from test_modul import (  # noqa: E402
+    ERREICHT_SPALTEN, GESPEICHERTE_SPALTEN, MAX_SPALTEN, MAXIMALPUNKTE_VORGABE, TESTERGEBNIS_SPALTEN,
+    speichere_testergebnisse,
+)
+
+TEILNEHMER = [
+    ('Anna Berg', '1234010190', 'KOCH', '2026-01-05', '2026-12-31'),
+    ('Ben Curt', '2345020291', 'MAURER', '2026-01-20', '2026-12-31'),
+    ('Cem Dag', '3456030392', 'KOCH', '2026-02-03', '2026-12-31'),
+]
+
+
+def _ergebnisse(teilnehmer_ids, test_datum, punkte):
+    """Testergebnisse mit gleichen Punkten in jeder Kategorie (Maximalpunkte wie in der Klasseneingabe)."""
+    zeilen = []
+    for teilnehmer_id in teilnehmer_ids:
+        zeile = {'teilnehmer_id': teilnehmer_id, 'test_datum': test_datum}
+        for erreicht, maximal, maximum in zip(ERREICHT_SPALTEN, MAX_SPALTEN, MAXIMALPUNKTE_VORGABE):
+            zeile[erreicht] = min(punkte, maximum)
+            zeile[maximal] = maximum
+        zeilen.append(zeile)
+    return pd.DataFrame(zeilen)
+
+
+@pytest.fixture(params=['sqlite', 'sqlalchemy'])
+def backend(request, tmp_path, monkeypatch):
+    """Leere Datenbank ohne Schema im gewählten Backend."""
+    if request.param == 'sqlalchemy':
+        pytest.importorskip('sqlalchemy')
+    # konfiguriere() schreibt die Umgebung; monkeypatch stellt sie danach wieder her
+    monkeypatch.setenv('MATHE_DATENBANK', '')
+    monkeypatch.setenv('MATHE_DATENBANK_URL', '')
+    pfad = str(tmp_path / 'mathe.db')
+    if request.param == 'sqlalchemy':
+        datenbank_modul.konfiguriere(url=f'sqlite:///{pfad}', pfad=pfad)
+    else:
+        datenbank_modul.konfiguriere(pfad=pfad)
+    yield request.param
+    datenbank_modul.konfiguriere()
+
+
+@pytest.fixture
+def datenbank(backend):
+    """Leere, migrierte Datenbank im gewählten Backend."""
+    migriere()
+    return backend
+
+
+def _teilnehmer_einfuegen():
+    with schreib_transaktion(aendert=('teilnehmer',)) as cursor:
+        speichere_teilnehmer(cursor, TEILNEHMER)
+    return lese_abfrage('SELECT id FROM teilnehmer ORDER BY id')['id'].tolist()
+
+
+def test_backend(datenbank):
+    erwartet = {'sqlite': 'SqliteSpeicher', 'sqlalchemy': 'SqlAlchemySpeicher'}[datenbank]
+    assert type(speicher()).__name__ == erwartet
+
+
+def test_migriere(datenbank):
+    versionen = lese_abfrage('SELECT version FROM schema_migrationen ORDER BY version')['version'].tolist()
+    assert versionen == sorted(version for version, _, _ in MIGRATIONEN)
+    # Zweiter Lauf wendet nichts mehr an
+    assert migriere() == []
+    for tabelle in ('teilnehmer', 'testergebnisse', 'ergebnis_zusammenfassung', 'aenderungsprotokoll'):
+        assert lese_abfrage(f'SELECT COUNT(*) AS anzahl FROM {tabelle}')['anzahl'].iloc[0] == 0
+
+
+def test_migration_6_protokolliert_nachgetragene_prozente(backend, monkeypatch):
+    monkeypatch.setattr(migration_modul, 'MIGRATIONEN', [m for m in MIGRATIONEN if m[0] < 6])
+    migriere()
+    ids = _teilnehmer_einfuegen()
+    # Bestand im Schema vor Migration 6 (ohne Prozentspalten)
+    ergebnisse = _ergebnisse(ids[:2], '2026-03-01', 10)
+    ergebnisse['gesamt_prozent'] = 60.0
+    with schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+        cursor.executemany(f'''
+        INSERT INTO testergebnisse ({', '.join(TESTERGEBNIS_SPALTEN)})
+        VALUES ({', '.join('?' * len(TESTERGEBNIS_SPALTEN))})
+        ''', ergebnisse[TESTERGEBNIS_SPALTEN].values.tolist())
+    seq = letzte_sequenz()
+
+    monkeypatch.setattr(migration_modul, 'MIGRATIONEN', MIGRATIONEN)
+    assert migriere() == [6]
+    aenderungen = lese_aenderungen(seq)
+    assert aenderungen['aktion'].tolist() == ['update', 'update']
+    assert aenderungen['datensatz_id'].tolist() == lese_abfrage('SELECT id FROM testergebnisse ORDER BY id')['id'].tolist()
+    daten = aenderungen['daten'].iloc[0]
+    assert set(daten) == set(PROZENT_SPALTEN)
+    assert daten['textaufgaben_prozent'] == {'alt': 0, 'neu': pytest.approx(50.0)}
+
+
+def test_einfuegen_mit_protokoll(datenbank):
+    ids = _teilnehmer_einfuegen()
+    with schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+        speichere_testergebnisse(cursor, _ergebnisse(ids, '2026-03-01', 10))
+
+    gespeichert = lese_abfrage('SELECT * FROM testergebnisse ORDER BY id')
+    assert gespeichert['teilnehmer_id'].tolist() == ids
+    # 10 von 20, 10 von 15, ... = 60 von 100 Punkten
+    assert gespeichert['gesamt_prozent'].tolist() == pytest.approx([60.0] * 3)
+    assert gespeichert['textaufgaben_prozent'].tolist() == pytest.approx([50.0] * 3)
+
+    assert zaehle_aenderungen(tabelle='teilnehmer', aktion='insert') == 3
+    assert zaehle_aenderungen(tabelle='testergebnisse', aktion='insert') == 3
+    daten = lese_aenderungen(tabelle='testergebnisse')['daten'].iloc[0]
+    assert set(daten) == set(GESPEICHERTE_SPALTEN)
+    assert daten['gesamt_prozent'] == pytest.approx(60.0)
+
+
+def test_zusammenfassung_wird_fortgeschrieben(datenbank):
+    ids = _teilnehmer_einfuegen()
+    # Zwei Transaktionen in dieselben Gruppen: die zweite addiert auf die vorhandenen Summen (ON CONFLICT)
+    for punkte in (10, 12):
+        with schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+            speichere_testergebnisse(cursor, _ergebnisse(ids, '2026-03-01', punkte))
+
+    zusammenfassung = lese_abfrage('''
+    SELECT berufswunsch, kohorte, test_monat, SUM(anzahl) AS anzahl, SUM(summe_gesamt) AS summe_gesamt
+    FROM ergebnis_zusammenfassung GROUP BY berufswunsch, kohorte, test_monat ORDER BY berufswunsch, kohorte
+    ''')
+    assert zusammenfassung[['berufswunsch', 'kohorte', 'test_monat']].values.tolist() == [
+        ['KOCH', '2026-01', '2026-03'], ['KOCH', '2026-02', '2026-03'], ['MAURER', '2026-01', '2026-03'],
+    ]
+    assert zusammenfassung['anzahl'].tolist() == [2, 2, 2]
+    assert zusammenfassung['summe_gesamt'].tolist() == pytest.approx([60.0 + 72.0] * 3)
+
+    # Die Summen entsprechen einer Neuberechnung aus den Testergebnissen
+    summen = lese_abfrage(f"SELECT {', '.join(f'SUM({spalte}) AS {spalte}' for spalte in SUMMEN_SPALTEN)} "
+                          'FROM ergebnis_zusammenfassung').iloc[0]
+    ergebnisse = lese_abfrage('SELECT gesamt_prozent, textaufgaben_prozent FROM testergebnisse')
+    assert summen['summe_gesamt'] == pytest.approx(ergebnisse['gesamt_prozent'].sum())
+    assert summen['summe_quadrat_gesamt'] == pytest.approx((ergebnisse['gesamt_prozent'] ** 2).sum())
+    assert summen['summe_textaufgaben'] == pytest.approx(ergebnisse['textaufgaben_prozent'].sum())
+
+
+def test_aenderungen_blaettern(datenbank):
+    ids = _teilnehmer_einfuegen()
+    for monat in range(1, 5):
+        with schreib_transaktion(aendert=('testergebnisse',)) as cursor:
+            speichere_testergebnisse(cursor, _ergebnisse(ids, f'2026-0{monat}-15', 8))
+
+    gelesen, seit_seq = [], 0
+    while not (seite := lese_aenderungen(seit_seq, limit=4)).empty:
+        assert len(seite) <= 4
+        gelesen.extend(seite['seq'].tolist())
+        seit_seq = int(seite['seq'].max())
+    assert gelesen == sorted(set(gelesen))
+    assert len(gelesen) == zaehle_aenderungen() == 3 + 4 * 3
+    assert seit_seq == letzte_sequenz()
+
+    nur_teilnehmer = lese_aenderungen(0, limit=100, tabelle='teilnehmer')
+    assert nur_teilnehmer['datensatz_id'].tolist() == ids
+
+
+def test_passe_sql_an_postgresql():
+    sql = passe_sql_an(
+        "SELECT json_object('a', a) FROM t WHERE name LIKE '%x' AND id = ? AND b = ?", 'postgresql', 'pyformat'
+    )
+    assert sql == "SELECT json_build_object('a', a) FROM t WHERE name LIKE '%%x' AND id = %s AND b = %s"
+    ddl = passe_sql_an('CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT)', 'postgresql', 'pyformat')
+    assert ddl == 'CREATE TABLE t (id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY)'
+    # SQLite-SQL bleibt unverändert
+    assert passe_sql_an('SELECT ? AS x', 'sqlite', 'qmark') == 'SELECT ? AS x'
+    with pytest.raises(ValueError):
+        passe_sql_an('SELECT ?', 'postgresql', 'numeric')
@@ -0,0 +1,265 @@
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datenbank_modul import lese_abfrage
+from protokoll_modul import letzte_sequenz, zaehle_aenderungen
+
+# Name des gespeicherten Modells (PyCaret hängt ".pkl" an)
+MODELL_NAME = 'bestes_prognose_modell'
+MODELL_DATEI = f"{MODELL_NAME}.pkl"
+STATUS_DATEI = f"{MODELL_NAME}.status.json"
+
+# Versionierte Modelle: <verzeichnis>/v0001.pkl mit Metadaten in v0001.json;
+# die aktive Version wird nach MODELL_DATEI kopiert und in aktiv.json vermerkt
+MODELL_VERZEICHNIS = os.environ.get('MATHE_MODELL_VERZEICHNIS', 'modelle')
+AKTIV_DATEI = os.path.join(MODELL_VERZEICHNIS, 'aktiv.json')
+
+# Nachtraining, sobald seit dem letzten Training so viele Testergebnisse hinzugekommen sind
+NACHTRAINING_AB_ZEILEN = int(os.environ.get('MATHE_NACHTRAINING_ZEILEN', '50'))
+# Ab diesem Anteil neuer Zeilen (bezogen auf die letzten Trainingszeilen) wieder alle
+# Modelle vergleichen; darunter wird nur das bisher beste Modell neu trainiert
+VOLLVERGLEICH_AB_ANTEIL = 0.5
+# Kennzahlen aus der Kreuzvalidierung von PyCaret, die mit jeder Version gespeichert werden
+METRIKEN = ['MAE', 'RMSE', 'R2']
+# Eine neue Version wird nur aktiviert, wenn ihr MAE höchstens um diesen Anteil
+# über dem der aktiven Version liegt (die Kreuzvalidierung streut etwas)
+VERGLEICHSMETRIK = 'MAE'
+AKTIVIERUNG_TOLERANZ = 0.02
+
+MERKMALE = [
+    'textaufgaben_erreicht', 'raumvorstellung_erreicht', 'gleichungen_erreicht',
+    'brueche_erreicht', 'grundrechenarten_erreicht', 'zahlenraum_erreicht'
+]
+ZIEL = 'gesamt_prozent'
+
+# Eingeschränkte Modellliste für compare_models (leer = alle PyCaret-Modelle)
+PYCARET_MODELLE = [
+    modell.strip() for modell in os.environ.get('MATHE_PYCARET_MODELLE', 'lr,ridge,lasso,huber,br').split(',')
+    if modell.strip()
+]
+
+_executor = None
+_sperre = threading.Lock()
+_job = None
+_job_start = None
+_job_ende = None
+
+
+# Modellversionen
+def _schreibe_json(pfad, inhalt):
+    """Schreibt eine JSON-Datei atomar (temporäre Datei, dann umbenennen)."""
+    temp_datei = f"{pfad}.{os.getpid()}.tmp"
+    with open(temp_datei, 'w', encoding='utf-8') as datei:
+        json.dump(inhalt, datei, indent=2)
+    os.replace(temp_datei, pfad)
+
+def _versionspfad(version, endung):
+    return os.path.join(MODELL_VERZEICHNIS, f"v{version:04d}.{endung}")
+
+def modellversionen():
+    """Metadaten aller gespeicherten Modellversionen, aufsteigend nach Version."""
+    try:
+        dateien = sorted(name for name in os.listdir(MODELL_VERZEICHNIS) if name.startswith('v') and name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+    versionen = []
+    for name in dateien:
+        with open(os.path.join(MODELL_VERZEICHNIS, name), encoding='utf-8') as datei:
+            versionen.append(json.load(datei))
+    return versionen
+
+def _aktiv_zustand():
+    """Inhalt von AKTIV_DATEI: version, fixiert, nachtraining_ab_seq (leer ohne aktive Version)."""
+    try:
+        with open(AKTIV_DATEI, encoding='utf-8') as datei:
+            return json.load(datei)
+    except (OSError, ValueError):
+        return {}
+
+def aktive_version():
+    """Metadaten der aktiven Modellversion oder None (kein oder unversioniertes Modell)."""
+    try:
+        with open(_versionspfad(_aktiv_zustand()['version'], 'json'), encoding='utf-8') as datei:
+            return json.load(datei)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def aktiviere_version(version, fixiert=False):
+    """Macht eine gespeicherte Version zum aktiven Modell.
+
+    Mit fixiert=True (Rollback von Hand) bleibt die Version aktiv, bis die
+    Fixierung aufgehoben wird: solange startet kein automatisches Nachtraining.
+    """
+    with open(_versionspfad(version, 'json'), encoding='utf-8') as datei:
+        metadaten = json.load(datei)
+    # Kopie neben MODELL_DATEI, dann atomar ersetzen: Leser sehen nie eine halbe Datei
+    temp_datei = f"{MODELL_NAME}.{os.getpid()}.tmp.pkl"
+    shutil.copyfile(_versionspfad(version, 'pkl'), temp_datei)
+    os.replace(temp_datei, MODELL_DATEI)
+    _schreibe_json(AKTIV_DATEI, {
+        'version': version, 'fixiert': fixiert, 'nachtraining_ab_seq': metadaten.get('letzte_seq'),
+    })
+    return metadaten
+
+def version_fixiert():
+    """Prüft, ob die aktive Version von Hand fixiert wurde."""
+    return bool(_aktiv_zustand().get('fixiert'))
+
+def hebe_fixierung_auf():
+    """Gibt eine fixierte Version wieder für das automatische Nachtraining frei."""
+    zustand = _aktiv_zustand()
+    if zustand:
+        _schreibe_json(AKTIV_DATEI, {**zustand, 'fixiert': False})
+
+def neue_zeilen_seit_training():
+    """Anzahl der Änderungen an Testergebnissen seit dem letzten Training."""
+    ab_seq = _aktiv_zustand().get('nachtraining_ab_seq')
+    if ab_seq is not None:
+        return zaehle_aenderungen(ab_seq, tabelle='testergebnisse')
+    # Versionen ohne Protokollstand: nach Ergebnis-id zählen (unversionierte Altmodelle: alles neu)
+    aktiv = aktive_version()
+    letzte_id = aktiv['letzte_ergebnis_id'] if aktiv else 0
+    return int(lese_abfrage('SELECT COUNT(*) AS anzahl FROM testergebnisse WHERE id > ?', (letzte_id,))['anzahl'].iloc[0])
+
+def nachtraining_faellig():
+    """Prüft die Nachtrainings-Regel (genügend neue Testergebnisse, kein laufendes Training, keine Fixierung)."""
+    return (not training_laeuft() and not version_fixiert()
+            and neue_zeilen_seit_training() >= NACHTRAINING_AB_ZEILEN)
+
+def ist_besser(metriken, vergleich):
+    """Prüft, ob eine neue Version die aktive ersetzen darf (VERGLEICHSMETRIK, kleiner ist besser)."""
+    if not vergleich or VERGLEICHSMETRIK not in vergleich or VERGLEICHSMETRIK not in metriken:
+        return True
+    return metriken[VERGLEICHSMETRIK] <= vergleich[VERGLEICHSMETRIK] * (1 + AKTIVIERUNG_TOLERANZ)
+
+
+# Worker-Prozess
+def _schreibe_phase(phase):
+    """Hält die aktuelle Trainingsphase für die Oberfläche fest (atomar ersetzt)."""
+    _schreibe_json(STATUS_DATEI, {'phase': phase, 'zeitpunkt': time.time()})
+
+def trainiere_und_speichere():
+    """Trainiert eine neue Modellversion (läuft im Worker-Prozess).
+
+    Ist seit dem letzten Training nur wenig hinzugekommen, wird nur das bisher
+    beste Modell neu trainiert statt alle Modelle zu vergleichen. Aktiviert
+    wird die Version nur, wenn ihre Kennzahlen nicht schlechter sind als die
+    der aktiven Version (siehe ist_besser). Gibt die Metadaten der neuen
+    Version zurück.
+    """
+    from pycaret.regression import setup, compare_models, create_model, pull, save_model
+
+    _schreibe_phase("Daten laden")
+    # Vor dem Laden merken: spätere Änderungen zählen für das nächste Nachtraining
+    letzte_seq = letzte_sequenz()
+    daten = lese_abfrage(f"SELECT id, {', '.join(MERKMALE + [ZIEL])} FROM testergebnisse").dropna()
+    if daten.shape[0] < 2:
+        raise ValueError("Nicht genügend Datenpunkte zum Trainieren des Modells.")
+    letzte_ergebnis_id = int(daten['id'].max())
+    daten = daten.drop(columns='id')
+
+    vorher = aktive_version()
+    vollvergleich = (
+        vorher is None
+        or daten.shape[0] - vorher['trainingszeilen'] >= VOLLVERGLEICH_AB_ANTEIL * vorher['trainingszeilen']
+    )
+
+    _schreibe_phase("Setup")
+    setup(data=daten, target=ZIEL, session_id=123, verbose=False)
+    if vollvergleich:
+        _schreibe_phase("Modellvergleich")
+        bestes_modell = compare_models(include=PYCARET_MODELLE or None, verbose=False)
+        # Rangliste: Index = Modell-ID, erste Zeile = bestes Modell
+        rangliste = pull()
+        modell_id, kennzahlen = rangliste.index[0], rangliste.iloc[0]
+    else:
+        modell_id = vorher['modell_id']
+        _schreibe_phase(f"Nachtraining ({modell_id})")
+        bestes_modell = create_model(modell_id, verbose=False)
+        kennzahlen = pull().loc['Mean']
+
+    # Erst vollständig unter der neuen Versionsnummer speichern, dann aktivieren:
+    # das alte Modell bleibt bis zum letzten Moment lesbar und wird nie halb geschrieben gelesen
+    _schreibe_phase("Speichern")
+    os.makedirs(MODELL_VERZEICHNIS, exist_ok=True)
+    versionen = modellversionen()
+    version = versionen[-1]['version'] + 1 if versionen else 1
+    temp_name = f"{MODELL_NAME}.{os.getpid()}.tmp"
+    save_model(bestes_modell, temp_name, verbose=False)
+    os.replace(f"{temp_name}.pkl", _versionspfad(version, 'pkl'))
+    metadaten = {
+        'version': version,
+        'zeitpunkt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'modell_id': str(modell_id),
+        'modus': 'vergleich' if vollvergleich else 'nachtraining',
+        'trainingszeilen': int(daten.shape[0]),
+        'letzte_ergebnis_id': letzte_ergebnis_id,
+        'letzte_seq': letzte_seq,
+        'metriken': {name: float(kennzahlen[name]) for name in METRIKEN if name in kennzahlen},
+    }
+    # Gegen die jetzt aktive Version vergleichen (sie kann während des Trainings gewechselt haben)
+    aktuell = aktive_version()
+    metadaten['aktiviert'] = ist_besser(metadaten['metriken'], aktuell['metriken'] if aktuell else None)
+    _schreibe_json(_versionspfad(version, 'json'), metadaten)
+    if metadaten['aktiviert']:
+        aktiviere_version(version)
+    else:
+        # Aktive Version behalten; das nächste Nachtraining zählt ab diesem Trainingsstand
+        _schreibe_json(AKTIV_DATEI, {**_aktiv_zustand(), 'nachtraining_ab_seq': letzte_seq})
+    _schreibe_phase("Fertig")
+    return metadaten
+
+
+# Job-Verwaltung im Streamlit-Prozess
+def _job_beendet(job):
+    global _job_ende
+    _job_ende = time.time()
+
+def starte_training():
+    """Startet ein Hintergrundtraining; läuft bereits eines, wird dieses zurückgegeben."""
+    global _executor, _job, _job_start, _job_ende
+    with _sperre:
+        if _job is not None and not _job.done():
+            return _job
+        if _executor is None:
+            # "spawn": keine geerbten SQLite-Verbindungen oder Streamlit-Threads im Worker
+            _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        _schreibe_phase("Wartend")
+        _job_start, _job_ende = time.time(), None
+        _job = _executor.submit(trainiere_und_speichere)
+        _job.add_done_callback(_job_beendet)
+        return _job
+
+def training_laeuft():
+    """Prüft, ob gerade ein Trainingsjob läuft."""
+    return _job is not None and not _job.done()
+
+def trainingsstatus():
+    """Gibt den Status des letzten Trainingsjobs zurück."""
+    job, start, ende = _job, _job_start, _job_ende
+    if job is None:
+        return {'zustand': 'keiner'}
+
+    status = {'dauer': (ende or time.time()) - start}
+    try:
+        with open(STATUS_DATEI, encoding='utf-8') as datei:
+            status['phase'] = json.load(datei)['phase']
+    except (OSError, ValueError, KeyError):
+        status['phase'] = None
+
+    if not job.done():
+        status['zustand'] = 'läuft'
+    elif job.exception() is not None:
+        status['zustand'] = 'fehlgeschlagen'
+        status['fehler'] = str(job.exception())
+    else:
+        status['zustand'] = 'fertig'
+        status['zeilen'] = job.result()['trainingszeilen']
+        status['version'] = job.result()['version']
+        status['modus'] = job.result()['modus']
+        status['aktiviert'] = job.result()['aktiviert']
+    return status